@@ -1,12 +1,24 @@
 import numpy as np
-from PIL import Image, ImageDraw
+from PIL import Image
 import os
-import urllib.request
+import sys
+import glob
+import shutil
+import time
+import argparse
+import struct
+import zlib
+from image_cache import ImageCache, hash_bytes, hash_file
+from png_encoding import PNG_PROFILES, DEFAULT_PNG_PROFILE, png_save_options, save_png
+from instrumentation import stage, image_nbytes, load_image
+from pixel_store import get_store, add_store_argument
+from pixel_buffer import as_image, iter_bands, read_into, BufferPool
 from io import BytesIO
 
 def create_test_image():
     """创建一个彩色的测试图像"""
     # 创建一个400x300的白色背景图像
+    from PIL import ImageDraw  # 只有生成测试图像时才需要
     img = Image.new('RGB', (400, 300), color='white')
     draw = ImageDraw.Draw(img)
     
@@ -36,13 +48,29 @@ def create_test_image():
     
     return img
 
-def download_sample_image():
-    """尝试从网络下载示例图像（使用urllib，无需requests库）"""
-    # 使用urllib下载示例图像
-    sample_urls = [
-        "https://picsum.photos/400/300",  # Lorem Picsum随机图片
-    ]
-    
+# 示例图像的下载地址
+SAMPLE_URLS = [
+    "https://picsum.photos/400/300",  # Lorem Picsum随机图片
+]
+
+def _download_key(url):
+    """示例图像下载结果的缓存键，由下载地址决定"""
+    return ImageCache.make_key(hash_bytes(url.encode('utf-8')), op="download")
+
+def download_sample_image(cache=None, sample_urls=SAMPLE_URLS):
+    """
+    尝试从网络下载示例图像（使用urllib，无需requests库）
+    :param cache: 可选的 ImageCache；命中时直接返回缓存内容，不再访问网络
+    :param sample_urls: 依次尝试的下载地址
+    """
+    import urllib.request  # 只在真正需要下载时导入，批量模式不加载网络相关模块
+    for url in sample_urls:
+        if cache is not None:
+            img = cache.get_image(_download_key(url))
+            if img is not None:
+                print(f"✓ 使用缓存的示例图像: {url}")
+                return img.convert("RGB")
+
     for i, url in enumerate(sample_urls):
         try:
             print(f"尝试从 {url} 下载示例图像 ({i+1}/{len(sample_urls)})...")
@@ -61,6 +89,8 @@ def download_sample_image():
             # 打开图像
             img = Image.open(BytesIO(data)).convert("RGB")
             print("✓ 成功下载示例图像！")
+            if cache is not None:
+                cache.put_bytes(_download_key(url), data)
             return img
             
         except Exception as e:
@@ -70,40 +100,377 @@ def download_sample_image():
     print("所有下载尝试都失败了，将使用内置测试图像")
     return None
 
-def extract_luminance(image, method="weighted"):
+# 亮度公式的 Q16 定点系数：Y = (wr*R + wg*G + wb*B + 2^15) >> 16
+# 系数之和不超过 65536，因此 uint32 累加不会溢出，结果也不会超过 255
+LUMA_SHIFT = 16
+LUMA_WEIGHTS = {
+    # 加权平均：0.299, 0.587, 0.114（BT.601标准）
+    "weighted": (np.uint32(19595), np.uint32(38470), np.uint32(7471)),
+    # BT.709（高清视频/sRGB）：0.2126, 0.7152, 0.0722
+    "bt709": (np.uint32(13933), np.uint32(46871), np.uint32(4732)),
+    # 简单平均：1/3 的定点近似，对所有 R+G+B 取值都与四舍五入后的 (R+G+B)/3 一致
+    "average": (np.uint32(21845), np.uint32(21845), np.uint32(21845)),
+}
+LUMA_WEIGHTS["bt601"] = LUMA_WEIGHTS["weighted"]
+# 非线性公式：逐像素取三通道的最大值 / 最小值
+LUMA_REDUCERS = {
+    "max": np.maximum,
+    "min": np.minimum,
+}
+LUMA_METHODS = tuple(LUMA_WEIGHTS) + tuple(LUMA_REDUCERS)
+# 每次计算的行数，限制 uint32 中间缓冲区的大小
+LUMA_BLOCK_ROWS = 256
+
+def _check_method(method):
+    if method not in LUMA_METHODS:
+        raise ValueError(f"method must be one of {', '.join(LUMA_METHODS)}")
+
+def luminance_arrays(rgb_array, methods=("weighted", "average"), outs=None):
+    """
+    一次遍历像素缓冲区，同时计算多种亮度公式
+    每个行块只读取一次 R、G、B 通道，再依次算出所有请求的公式。
+    :param rgb_array: 形状为 (H, W, 3) 的 uint8 数组
+    :param methods: 亮度计算方法列表，取值见 LUMA_METHODS
+    :param outs: 可选字典 {方法: 预分配的 uint8 数组 (H, W)}，用于复用输出内存
+    :return: 字典 {方法: 亮度数组(uint8)}
+    """
+    for method in methods:
+        _check_method(method)
+
+    height, width = rgb_array.shape[:2]
+    outs = dict(outs or {})
+    for method in methods:
+        out = outs.get(method)
+        if out is None:
+            outs[method] = np.empty((height, width), dtype=np.uint8)
+        elif out.shape != (height, width) or out.dtype != np.uint8:
+            raise ValueError(f"out must be a uint8 array of shape {(height, width)}")
+
+    with stage("luminance", rgb_array.nbytes, methods=len(methods)):
+        _compute_luminances(rgb_array, methods, outs)
+    return {method: outs[method] for method in methods}
+
+def _compute_luminances(rgb_array, methods, outs):
+    """luminance_arrays 的计算部分：不检查参数、不记录阶段，结果写入 outs 中已分配好的数组"""
+    height, width = rgb_array.shape[:2]
+    # 按行分块计算，中间缓冲区只占 LUMA_BLOCK_ROWS 行，而不是整幅 float64 临时数组
+    block_rows = max(1, min(LUMA_BLOCK_ROWS, height))
+    acc = np.empty((block_rows, width), dtype=np.uint32)
+    tmp = np.empty((block_rows, width), dtype=np.uint32)
+
+    for start in range(0, height, block_rows):
+        stop = min(start + block_rows, height)
+        block = rgb_array[start:stop]
+        r, g, b = block[:, :, 0], block[:, :, 1], block[:, :, 2]
+        a = acc[:stop - start]
+        t = tmp[:stop - start]
+
+        for method in methods:
+            out = outs[method][start:stop]
+            if method in LUMA_REDUCERS:
+                reduce = LUMA_REDUCERS[method]
+                reduce(r, g, out=out)
+                reduce(out, b, out=out)
+                continue
+
+            wr, wg, wb = LUMA_WEIGHTS[method]
+            np.multiply(r, wr, out=a)
+            np.multiply(g, wg, out=t)
+            a += t
+            np.multiply(b, wb, out=t)
+            a += t
+            # 加上 0.5 后右移，实现四舍五入
+            a += np.uint32(1 << (LUMA_SHIFT - 1))
+            a >>= LUMA_SHIFT
+            np.copyto(out, a, casting='unsafe')
+
+def luminance_array(rgb_array, method="weighted", out=None):
+    """
+    用整数定点运算从RGB数组计算亮度数组
+    :param rgb_array: 形状为 (H, W, 3) 的 uint8 数组
+    :param method: 亮度计算方法，"weighted"（加权平均，默认）、"average"（简单平均）等，见 LUMA_METHODS
+    :param out: 可选的预分配输出数组，uint8，形状为 (H, W)；重复调用时传入可复用内存
+    :return: 亮度数组（uint8；提供 out 时返回的就是 out）
+    """
+    return luminance_arrays(rgb_array, (method,), {method: out})[method]
+
+def _to_rgb_array(image):
+    """PIL 图像 -> (H, W, 3) uint8 数组，按行带转换为RGB并写入同一块内存；已经是数组时原样返回"""
+    if isinstance(image, np.ndarray):
+        return image
+    return read_into(load_image(image), mode="RGB")
+
+def _image_luminances(image, methods, outs=None):
+    """
+    从 PIL 图像或RGB数组计算多种亮度，参数同 luminance_arrays
+    PIL 图像按行带交给 numpy（见 pixel_buffer.iter_bands），不生成整幅的RGB数组，结果直接写入输出数组。
+    L 模式图像的三个通道相等，各公式的结果都等于灰度值本身（定点系数之和为 65536，average 为 65535，
+    四舍五入后同样精确），因此直接复制灰度值，不展开成RGB。
+    整幅只产生一条 luminance 记录（包含各行带转换为RGB的耗时），不按行带逐条记录。
+    """
+    if isinstance(image, np.ndarray):
+        return luminance_arrays(image, methods, outs)
+    for method in methods:
+        _check_method(method)
+    load_image(image)
+    outs = {method: (outs or {}).get(method) for method in methods}
+    for method in methods:
+        if outs[method] is None:
+            outs[method] = np.empty((image.height, image.width), dtype=np.uint8)
+        elif outs[method].shape != (image.height, image.width) or outs[method].dtype != np.uint8:
+            raise ValueError(f"out must be a uint8 array of shape {(image.height, image.width)}")
+
+    gray = image.mode == 'L'
+    with stage("luminance", image_nbytes(image), methods=len(methods)):
+        for start, band in iter_bands(image, LUMA_BLOCK_ROWS, mode=None if gray else "RGB"):
+            stop = start + band.shape[0]
+            if gray:
+                for method in methods:
+                    outs[method][start:stop] = band
+            else:
+                _compute_luminances(band, methods, {method: outs[method][start:stop] for method in methods})
+    return outs
+
+def extract_luminance(image, method="weighted", out=None):
     """
     从图像中抽取亮度图
+    :param image: PIL Image对象，或 (H, W, 3) uint8 数组（如 PixelStore.open_array 内存映射的像素）
+    :param method: 亮度计算方法，"weighted"（加权平均，默认）、"average"（简单平均）等，见 LUMA_METHODS
+    :param out: 可选的预分配 uint8 数组，形状为 (高, 宽)，用于复用输出内存
+    :return: 亮度图（PIL Image对象；提供 out 时与 out 共享内存）
+    """
+    luminance = _image_luminances(image, (method,), {method: out})[method]
+
+    # 转为PIL灰度图（单通道），与数组共享内存，不复制
+    luminance_img = as_image(luminance)
+
+    return luminance_img
+
+def extract_luminances(image, methods=("weighted", "average")):
+    """
+    只做一次RGB转换和数组拷贝，同时抽取多种亮度图
     :param image: PIL Image对象
-    :param method: 亮度计算方法，"weighted"（加权平均，默认）或 "average"（简单平均）
-    :return: 亮度图（PIL Image对象）
+    :param methods: 亮度计算方法列表
+    :return: 字典 {方法: 亮度图(PIL Image对象)}
     """
-    # 确保图像是RGB模式
-    if image.mode != 'RGB':
-        image = image.convert("RGB")
-    
-    rgb_array = np.array(image)
-    
-    # 分离R、G、B通道
-    r = rgb_array[:, :, 0]
-    g = rgb_array[:, :, 1] 
-    b = rgb_array[:, :, 2]
-    
-    # 计算亮度图
-    if method == "weighted":
-        # 加权平均：符合人眼感知的亮度公式（BT.601标准）
-        luminance = 0.299 * r + 0.587 * g + 0.114 * b
-    elif method == "average":
-        # 简单平均：三通道直接平均
-        luminance = (r + g + b) / 3
+    arrays = _image_luminances(image, methods)
+    return {method: as_image(array) for method, array in arrays.items()}
+
+def build_comparison_array(rgb_array, luminances):
+    """
+    直接用 numpy 数组拼接对比图：原图在左，各亮度图依次排在右侧
+    :param rgb_array: 原图 (H, W, 3) uint8 数组
+    :param luminances: 亮度数组列表，每个形状为 (H, W)
+    :return: (H, W * (1 + 亮度图数量), 3) uint8 数组
+    """
+    height, width = rgb_array.shape[:2]
+    comparison = np.empty((height, width * (1 + len(luminances)), 3), dtype=np.uint8)
+    comparison[:, :width] = rgb_array
+    for i, luminance in enumerate(luminances, start=1):
+        # 灰度广播到三个通道，省去 Image.merge 的中间图像
+        comparison[:, width * i:width * (i + 1)] = luminance[:, :, None]
+    return comparison
+
+# ---------------- 流式（按行带）亮度抽取 ----------------
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# 每个行带的行数，峰值内存与 行带行数 × 图像宽度 成正比
+STREAM_BAND_ROWS = 512
+# PNG 颜色类型 -> 每像素通道数（仅支持 8 位深度）
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# IDAT 数据块每次从文件读取的字节数；整幅图像写成一个 IDAT 时，压缩数据也只按这个大小分段驻留内存
+PNG_READ_SIZE = 64 * 1024
+
+def _png_chunk(chunk_type, data):
+    """按 PNG 格式打包一个数据块（长度 + 类型 + 数据 + CRC）"""
+    crc = zlib.crc32(chunk_type + data) & 0xffffffff
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+def _read_exact(f, size):
+    data = f.read(size)
+    if len(data) < size:
+        raise ValueError("PNG文件不完整")
+    return data
+
+def _check_crc(f, chunk_type, crc):
+    """读取数据块末尾存储的 CRC 并与计算值比较"""
+    if struct.unpack(">I", _read_exact(f, 4))[0] != crc & 0xffffffff:
+        raise ValueError(f"PNG数据块 {chunk_type.decode('latin-1')} 的CRC校验失败，文件可能已损坏")
+
+def _iter_png_chunks(f, read_size=PNG_READ_SIZE):
+    """
+    逐个读取 PNG 数据块并校验 CRC，返回 (类型, 数据)
+    IDAT 数据块按 read_size 分段读取，一个 IDAT 会依次产生多个 (b'IDAT', 分段数据)，
+    其 CRC 在最后一段交给调用方之后才校验；其他数据块整块读取，校验后再返回。
+    """
+    if f.read(8) != PNG_SIGNATURE:
+        raise ValueError("不是有效的PNG文件")
+    while True:
+        length, chunk_type = struct.unpack(">I4s", _read_exact(f, 8))
+        crc = zlib.crc32(chunk_type)
+        if chunk_type == b'IDAT':
+            remaining = length
+            while remaining:
+                data = _read_exact(f, min(remaining, read_size))
+                crc = zlib.crc32(data, crc)
+                remaining -= len(data)
+                yield chunk_type, data
+            _check_crc(f, chunk_type, crc)
+            continue
+        data = _read_exact(f, length)
+        _check_crc(f, chunk_type, zlib.crc32(data, crc))
+        yield chunk_type, data
+        if chunk_type == b'IEND':
+            return
+
+def iter_png_bands(input_path, band_rows=STREAM_BAND_ROWS):
+    """
+    按行带逐段解码PNG，内存占用只与行带大小有关
+    原理：PNG 每行的反滤波只依赖上一行，因此把"上一行的解码结果（滤波类型0）"
+    和当前行带的原始滤波数据拼成一个小 PNG，交给 Pillow 的 C 解码器处理。
+    :param input_path: PNG 文件路径（8 位深度、非隔行扫描）
+    :param band_rows: 每个行带的行数
+    :return: 生成器，依次产生 (起始行号, 行带 PIL Image对象)
+    """
+    with open(input_path, 'rb') as f:
+        chunks = _iter_png_chunks(f)
+        chunk_type, ihdr = next(chunks)
+        if chunk_type != b'IHDR':
+            raise ValueError("PNG文件缺少IHDR")
+        width, height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", ihdr)
+        if bit_depth != 8 or color_type not in PNG_CHANNELS:
+            raise ValueError("流式模式仅支持8位深度的PNG，请使用 extract_luminance")
+        if interlace:
+            raise ValueError("流式模式不支持隔行扫描的PNG，请使用 extract_luminance")
+
+        stride = width * PNG_CHANNELS[color_type] + 1
+        band_bytes = band_rows * stride
+        extra_chunks = b''
+        decompressor = zlib.decompressobj()
+        pending = bytearray()
+        prev_row = None
+        row = 0
+
+        def decode_band(filtered):
+            nonlocal prev_row, row
+            with stage("decode", len(filtered)):
+                rows = len(filtered) // stride
+                data = bytes(filtered)
+                if prev_row is not None:
+                    data = b'\x00' + prev_row + data
+                band_ihdr = struct.pack(">IIBBBBB", width, rows + (prev_row is not None),
+                                        8, color_type, 0, 0, 0)
+                mini_png = (PNG_SIGNATURE + _png_chunk(b'IHDR', band_ihdr) + extra_chunks
+                            + _png_chunk(b'IDAT', zlib.compress(data, 0))
+                            + _png_chunk(b'IEND', b''))
+                band = Image.open(BytesIO(mini_png))
+                band.load()
+                if prev_row is not None:
+                    band = band.crop((0, 1, width, rows + 1))
+                prev_row = band.crop((0, rows - 1, width, rows)).tobytes()
+            start = row
+            row += rows
+            return start, band
+
+        for chunk_type, data in chunks:
+            if chunk_type in (b'PLTE', b'tRNS'):
+                extra_chunks += _png_chunk(chunk_type, data)
+            elif chunk_type == b'IDAT':
+                # 数据已按 PNG_READ_SIZE 分段读取；再限制每次解压的输出长度，避免一段解压出过多行
+                while data:
+                    pending += decompressor.decompress(data, band_bytes)
+                    data = decompressor.unconsumed_tail
+                    while len(pending) >= band_bytes:
+                        yield decode_band(pending[:band_bytes])
+                        del pending[:band_bytes]
+
+        pending += decompressor.flush()
+        while pending and row < height:
+            chunk = pending[:band_bytes]
+            del pending[:band_bytes]
+            yield decode_band(chunk)
+
+        if row != height:
+            raise ValueError(f"PNG数据不完整: 期望{height}行，实际{row}行")
+
+class _StreamingPngWriter:
+    """把灰度行带逐段压缩写入PNG文件，不需要在内存中保留整幅图像"""
+
+    def __init__(self, f, width, height, compress_level=6, text=None):
+        self._f = f
+        self._width = width
+        self._compressor = zlib.compressobj(compress_level)
+        self._row_buffer = None
+        f.write(PNG_SIGNATURE)
+        f.write(_png_chunk(b'IHDR', struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)))
+        for key, value in (text or {}).items():
+            f.write(_png_chunk(b'tEXt', key.encode('latin-1') + b'\0' + value.encode('latin-1')))
+
+    def write_rows(self, rows):
+        """写入若干行 uint8 灰度数据（形状 (n, 宽)）"""
+        n = rows.shape[0]
+        if self._row_buffer is None or self._row_buffer.shape[0] < n:
+            # 每行前面是滤波类型字节 0（不滤波）
+            self._row_buffer = np.zeros((n, self._width + 1), dtype=np.uint8)
+        buffer = self._row_buffer[:n]
+        buffer[:, 1:] = rows
+        with stage("encode", rows.nbytes):
+            data = self._compressor.compress(buffer.tobytes())
+            if data:
+                self._f.write(_png_chunk(b'IDAT', data))
+
+    def close(self):
+        self._f.write(_png_chunk(b'IDAT', self._compressor.flush()))
+        self._f.write(_png_chunk(b'IEND', b''))
+
+def extract_luminance_streaming(input_path, output_path, method="weighted", band_rows=STREAM_BAND_ROWS,
+                                profile=DEFAULT_PNG_PROFILE, text=None):
+    """
+    流式抽取亮度图：按行带解码、计算并直接写出，峰值内存只取决于行带大小
+    结果与 extract_luminance 逐像素完全一致。
+    :param input_path: 输入PNG文件路径
+    :param output_path: 输出路径；以 .npy 结尾时写入内存映射的 numpy 数组，否则写为灰度PNG
+    :param method: 亮度计算方法，同 extract_luminance
+    :param band_rows: 每个行带的行数
+    :param profile: 输出PNG的编码配置（只使用其中的压缩级别）
+    :param text: 可选的 {关键字: 文本}，输出为PNG时写入 tEXt 数据块
+    :return: 输出图像尺寸 (宽, 高)
+    """
+    _check_method(method)
+
+    with open(input_path, 'rb') as f:
+        chunks = _iter_png_chunks(f)
+        _, ihdr = next(chunks)
+    width, height = struct.unpack(">II", ihdr[:8])
+
+    bands = iter_png_bands(input_path, band_rows)
+    if output_path.lower().endswith('.npy'):
+        out = np.lib.format.open_memmap(output_path, mode='w+', dtype=np.uint8, shape=(height, width))
+        try:
+            for start, band in bands:
+                rgb_band = _to_rgb_array(band)
+                luminance_array(rgb_band, method=method, out=out[start:start + band.height])
+            out.flush()
+        finally:
+            del out
     else:
-        raise ValueError("method must be 'weighted' or 'average'")
-    
-    # 亮度值取整并确保在[0,255]范围内，转为uint8类型
-    luminance = np.clip(luminance, 0, 255).astype(np.uint8)
-    # 转为PIL灰度图（单通道）
-    luminance_img = Image.fromarray(luminance, mode="L")
-    
-    return luminance_img
+        lum_buffer = np.empty((band_rows, width), dtype=np.uint8)
+        with open(output_path, 'wb') as f:
+            compress_level = png_save_options(profile)["compress_level"]
+            writer = _StreamingPngWriter(f, width, height, compress_level, text)
+            for start, band in bands:
+                rgb_band = _to_rgb_array(band)
+                rows = luminance_array(rgb_band, method=method, out=lum_buffer[:band.height])
+                writer.write_rows(rows)
+            writer.close()
+
+    return width, height
+
+def _save_and_cache(cache, key, image, output_path):
+    """把派生图像保存为PNG，并把输出文件的字节写入缓存（之后命中时直接复制）"""
+    save_png(image, output_path)
+    with open(output_path, 'rb') as f:
+        cache.put_bytes(key, f.read())
 
 def main():
     print("=== PNG亮度图抽取工具 (无额外依赖版) ===")
@@ -121,11 +488,14 @@ def main():
     
     image_path = "example.png"
     original_img = None
+    image_on_disk = False
+    cache = ImageCache()
     
     # 方法1：检查是否已有本地图像
     if os.path.exists(image_path):
         try:
             original_img = Image.open(image_path)
+            image_on_disk = True
             print(f"✓ 找到本地图像: {image_path}")
         except Exception as e:
             print(f"× 本地图像损坏: {e}")
@@ -134,11 +504,12 @@ def main():
     # 方法2：如果没有本地图像，尝试下载
     if original_img is None:
         print("\n尝试下载网络示例图像...")
-        downloaded_img = download_sample_image()
+        downloaded_img = download_sample_image(cache=cache)
         if downloaded_img is not None:
             original_img = downloaded_img
             try:
                 original_img.save(image_path)
+                image_on_disk = True
                 print(f"✓ 下载的示例图像已保存为: {image_path}")
             except Exception as e:
                 print(f"× 保存下载的图像失败: {e}")
@@ -150,6 +521,7 @@ def main():
         original_img = create_test_image()
         try:
             original_img.save(image_path)
+            image_on_disk = True
             print(f"✓ 测试图像已创建并保存为: {image_path}")
         except Exception as e:
             print(f"× 保存测试图像失败: {e}")
@@ -157,65 +529,80 @@ def main():
     
     print(f"\n图像信息: 尺寸={original_img.size}, 模式={original_img.mode}")
     
+    # 输入内容的摘要：输入不变时，派生结果直接从缓存读取
+    if image_on_disk:
+        source_digest = hash_file(image_path)
+    else:
+        source_digest = hash_bytes(original_img.tobytes())
+    methods = ("weighted", "average")
+    # 缓存中保存的就是输出文件的字节，因此键中包含编码配置；命中时直接复制文件，不解码也不重新编码
+    lum_keys = {m: ImageCache.make_key(source_digest, op="luminance", method=m,
+                                       mode=original_img.mode, size=original_img.size,
+                                       profile=DEFAULT_PNG_PROFILE)
+                for m in methods}
+    comparison_key = ImageCache.make_key(source_digest, op="comparison", methods=methods,
+                                         mode=original_img.mode, size=original_img.size,
+                                         profile=DEFAULT_PNG_PROFILE)
+    lum_files = {"weighted": "luminance_weighted.png", "average": "luminance_average.png"}
+    lum_labels = {"weighted": "加权平均亮度图", "average": "简单平均亮度图"}
+    comparison_file = "comparison_result.png"
+    lum_images = {}  # 本次计算出的亮度图；命中缓存时为空，需要显示时再从输出文件读取
+    lum_arrays = None
+    rgb_array = None
+    
     # 抽取两种亮度图
     print("\n正在计算亮度图...")
     try:
-        print("1. 计算加权平均亮度图...")
-        weighted_lum = extract_luminance(original_img, method="weighted")
-        
-        print("2. 计算简单平均亮度图...")  
-        average_lum = extract_luminance(original_img, method="average")
+        cached = {m: cache.get_path(lum_keys[m]) for m in methods}
+        if all(path is not None for path in cached.values()):
+            print("✓ 输入未变化，直接使用缓存的亮度图")
+        else:
+            # 只做一次RGB转换和数组拷贝，一次遍历同时算出两种亮度
+            print("计算加权平均和简单平均亮度图...")
+            rgb_array = _to_rgb_array(original_img)
+            lum_arrays = luminance_arrays(rgb_array, methods)
+            lum_images = {m: as_image(lum_arrays[m]) for m in methods}
         
         print("✓ 亮度图计算完成")
     except Exception as e:
         print(f"× 计算亮度图时出错: {e}")
         return
     
-    # 显示图像信息
+    # 显示图像信息（亮度图与原图同尺寸，均为 L 模式）
     print(f"\n结果图像信息:")
     print(f"- 原图: {original_img.size}, {original_img.mode}")
-    print(f"- 加权平均亮度图: {weighted_lum.size}, {weighted_lum.mode}")  
-    print(f"- 简单平均亮度图: {average_lum.size}, {average_lum.mode}")
+    for m in methods:
+        print(f"- {lum_labels[m]}: {original_img.size}, L")
     
     # 保存结果
     output_files = []
     
-    try:
-        # 保存加权平均亮度图
-        weighted_file = "luminance_weighted.png"
-        weighted_lum.save(weighted_file)
-        output_files.append(weighted_file)
-        print(f"✓ 已保存: {weighted_file}")
-    except Exception as e:
-        print(f"× 保存加权平均亮度图失败: {e}")
-    
-    try:
-        # 保存简单平均亮度图
-        average_file = "luminance_average.png" 
-        average_lum.save(average_file)
-        output_files.append(average_file)
-        print(f"✓ 已保存: {average_file}")
-    except Exception as e:
-        print(f"× 保存简单平均亮度图失败: {e}")
+    for m in methods:
+        try:
+            if m in lum_images:
+                _save_and_cache(cache, lum_keys[m], lum_images[m], lum_files[m])
+            else:
+                shutil.copyfile(cached[m], lum_files[m])
+            output_files.append(lum_files[m])
+            print(f"✓ 已保存: {lum_files[m]}")
+        except Exception as e:
+            print(f"× 保存{lum_labels[m]}失败: {e}")
     
     # 创建对比图
     try:
         print("正在创建对比图...")
-        width, height = original_img.size
-        comparison_img = Image.new('RGB', (width * 3, height))
-        
-        # 将原图和亮度图粘贴到对比图上
-        comparison_img.paste(original_img, (0, 0))
-        
-        # 将灰度图转换为RGB以便拼接
-        weighted_rgb = Image.merge('RGB', [weighted_lum, weighted_lum, weighted_lum])
-        average_rgb = Image.merge('RGB', [average_lum, average_lum, average_lum])
-        
-        comparison_img.paste(weighted_rgb, (width, 0))
-        comparison_img.paste(average_rgb, (width * 2, 0))
-        
-        comparison_file = "comparison_result.png"
-        comparison_img.save(comparison_file)
+        cached_comparison = cache.get_path(comparison_key)
+        if cached_comparison is not None:
+            shutil.copyfile(cached_comparison, comparison_file)
+        else:
+            if rgb_array is None:
+                rgb_array = _to_rgb_array(original_img)
+            if lum_arrays is None:
+                lum_arrays = luminance_arrays(rgb_array, methods)
+            # 直接在 numpy 数组上拼接原图和两幅亮度图（RGB 转为 PIL 时复制一次）
+            comparison_img = as_image(build_comparison_array(
+                rgb_array, [lum_arrays["weighted"], lum_arrays["average"]]))
+            _save_and_cache(cache, comparison_key, comparison_img, comparison_file)
         output_files.append(comparison_file)
         print(f"✓ 已保存: {comparison_file}")
     except Exception as e:
@@ -229,14 +616,13 @@ def main():
         print("✓ 已显示原始图像")
         display_success = True
         
-        weighted_lum.show(title="2. 加权平均亮度图")
-        print("✓ 已显示加权平均亮度图")
-        
-        average_lum.show(title="3. 简单平均亮度图") 
-        print("✓ 已显示简单平均亮度图")
+        # 命中缓存时亮度图没有解码过，只在这里显示时才从输出文件读取
+        for number, m in enumerate(methods, start=2):
+            (lum_images[m] if m in lum_images else Image.open(lum_files[m])).show(title=f"{number}. {lum_labels[m]}")
+            print(f"✓ 已显示{lum_labels[m]}")
         
-        if any("comparison_result.png" in f for f in output_files):
-            Image.open("comparison_result.png").show(title="4. 对比图")
+        if comparison_file in output_files:
+            Image.open(comparison_file).show(title="4. 对比图")
             print("✓ 已显示对比图")
             
     except Exception as e:
@@ -259,5 +645,207 @@ def main():
     print("- 如果看不到图像，请检查系统的图片查看器")
     print("- 要使用自己的图像，请将PNG文件重命名为 'example.png' 放在此目录")
 
+# ---------------- 批量处理（多进程） ----------------
+
+BATCH_OUTPUT_SUFFIX = "_luminance.png"
+# 批量输出的 tEXt 数据块中记录生成参数的关键字；与本次参数不同的输出视为过期
+BATCH_PARAMS_KEY = "luminance-params"
+
+def _batch_params(method, profile):
+    """批量输出记录的生成参数：亮度计算方法和PNG编码配置"""
+    return f"method={method};profile={profile}"
+
+def collect_batch_tasks(inputs, output_dir, recursive=False):
+    """
+    把输入的文件、目录或通配符展开为 (输入路径, 输出路径) 列表
+    目录输入会在输出目录下保留相对目录结构；文件和通配符输入直接以文件名输出。
+    文件名以 BATCH_OUTPUT_SUFFIX 结尾的是之前的输出，不会被当作输入，
+    因此输出目录可以就是输入目录（原地处理），重新运行时也不会处理自己上次的输出。
+    :raises ValueError: 不同输入映射到同一个输出文件时（如 a/x.png 和 b/x.png）
+    """
+    tasks = []
+    seen = set()
+    outputs = {}
+    for spec in inputs:
+        if os.path.isdir(spec):
+            pattern = os.path.join(spec, "**", "*.png") if recursive else os.path.join(spec, "*.png")
+            root = spec
+        else:
+            pattern = spec
+            root = None
+        for path in sorted(glob.glob(pattern, recursive=recursive)):
+            if not os.path.isfile(path) or path.endswith(BATCH_OUTPUT_SUFFIX):
+                continue
+            key = os.path.abspath(path)
+            if key in seen:
+                continue
+            seen.add(key)
+            rel = os.path.relpath(path, root) if root else os.path.basename(path)
+            stem = os.path.splitext(rel)[0]
+            output_path = os.path.join(output_dir, stem + BATCH_OUTPUT_SUFFIX)
+            other = outputs.setdefault(os.path.abspath(output_path), path)
+            if other != path:
+                raise ValueError(f"{other} 和 {path} 会输出到同一个文件 {output_path}，"
+                                 "请分开到不同的输出目录处理")
+            tasks.append((path, output_path))
+    return tasks
+
+def is_up_to_date(input_path, output_path, params=None):
+    """
+    输出文件存在、不早于输入文件时视为已是最新
+    :param params: 本次的生成参数（见 _batch_params）；给出时还要求输出中记录的参数相同，
+                   没有记录参数的旧输出视为过期
+    """
+    try:
+        if os.path.getmtime(output_path) < os.path.getmtime(input_path):
+            return False
+        if params is None:
+            return True
+        # 只读取文件头部的数据块，不解码像素
+        with Image.open(output_path) as img:
+            return img.info.get(BATCH_PARAMS_KEY) == params
+    except OSError:
+        return False
+
+def _convert_one(input_path, output_path, method, stream, profile, pixel_store=None, buffers=None):
+    """
+    在工作进程中完成一张图片的解码、亮度计算和编码；先写临时文件再原子替换
+    提供 pixel_store 时RGB像素从内存映射的 .npy 读取（首次运行时解码并写入）；流式模式不使用它
+    提供 buffers (BufferPool) 时亮度结果写入复用的缓冲区，同尺寸的图片不再重新分配
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    base, ext = os.path.splitext(output_path)
+    tmp_path = f"{base}.{os.getpid()}.tmp{ext}"
+    text = {BATCH_PARAMS_KEY: _batch_params(method, profile)}
+    try:
+        if stream:
+            width, height = extract_luminance_streaming(input_path, tmp_path, method=method, profile=profile,
+                                                        text=text)
+        else:
+            if pixel_store is not None:
+                source = pixel_store.open_array(input_path, "RGB")
+                size = (source.shape[1], source.shape[0])
+            else:
+                source = Image.open(input_path)
+                size = source.size
+            out = buffers.get((size[1], size[0])) if buffers is not None else None
+            try:
+                luminance_img = extract_luminance(source, method=method, out=out)
+            finally:
+                if isinstance(source, Image.Image):
+                    source.close()
+            width, height = luminance_img.size
+            save_png(luminance_img, tmp_path, profile, text)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return width * height
+
+def _convert_chunk(tasks, method, stream, profile, pixel_store=None):
+    """
+    工作进程入口：处理一组任务，只把统计信息返回给父进程
+    :return: [(输入路径, 输入字节数, 像素数, 错误信息或None), ...]
+    """
+    results = []
+    buffers = BufferPool()
+    for input_path, output_path in tasks:
+        try:
+            size = os.path.getsize(input_path)
+            pixels = _convert_one(input_path, output_path, method, stream, profile, pixel_store, buffers)
+            results.append((input_path, size, pixels, None))
+        except Exception as e:
+            # 文件在收集之后被删除或无法读取时只记为一次失败，不中断整个批次
+            results.append((input_path, 0, 0, str(e)))
+    return results
+
+def run_batch(tasks, method="weighted", workers=None, chunk_size=16, force=False, stream=False,
+              profile=DEFAULT_PNG_PROFILE, pixel_store=None):
+    """
+    用进程池批量抽取亮度图
+    父进程只负责分发路径和汇总统计，像素数据的解码/编码全部在工作进程中完成。
+    :param tasks: (输入路径, 输出路径) 列表，见 collect_batch_tasks
+    :param method: 亮度计算方法
+    :param workers: 工作进程数，默认为 CPU 核数
+    :param chunk_size: 每个提交任务包含的图片数
+    :param force: 为 True 时忽略"已是最新"检查，全部重新生成；method 或 profile 与上次不同的输出总会重新生成
+    :param stream: 为 True 时使用按行带的流式处理（适合超大图片）
+    :param profile: 输出PNG的编码配置，见 png_encoding.PNG_PROFILES
+    :param pixel_store: 可选的 PixelStore，重复处理同一批图片时跳过PNG解码
+    :return: 统计信息字典
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    workers = workers or os.cpu_count() or 1
+    params = _batch_params(method, profile)
+    todo = tasks if force else [t for t in tasks if not is_up_to_date(*t, params)]
+    stats = {"total": len(tasks), "skipped": len(tasks) - len(todo), "done": 0,
+             "failed": 0, "bytes": 0, "pixels": 0, "seconds": 0.0}
+
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # 限制同时在途的任务数，避免一次性提交上万个 future
+        max_in_flight = workers * 2
+        pending = set()
+        next_chunk = 0
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < max_in_flight:
+                pending.add(executor.submit(_convert_chunk, chunks[next_chunk], method, stream, profile,
+                                            pixel_store))
+                next_chunk += 1
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                for input_path, size, pixels, error in future.result():
+                    if error is None:
+                        stats["done"] += 1
+                        stats["bytes"] += size
+                        stats["pixels"] += pixels
+                    else:
+                        stats["failed"] += 1
+                        print(f"× {input_path}: {error}")
+    stats["seconds"] = time.perf_counter() - start_time
+    return stats
+
+def batch_main(argv=None):
+    """批量处理命令行入口"""
+    parser = argparse.ArgumentParser(description="批量抽取PNG亮度图（多进程）")
+    parser.add_argument("inputs", nargs="+", help="输入文件、目录或通配符（如 'scans/*.png'）")
+    parser.add_argument("-o", "--output-dir", default="luminance_output", help="输出目录")
+    parser.add_argument("-m", "--method", default="weighted", choices=LUMA_METHODS)
+    parser.add_argument("-j", "--workers", type=int, default=None, help="工作进程数（默认CPU核数）")
+    parser.add_argument("--chunk-size", type=int, default=16, help="每个提交任务包含的图片数")
+    parser.add_argument("-r", "--recursive", action="store_true", help="递归搜索子目录")
+    parser.add_argument("-f", "--force", action="store_true", help="即使输出已是最新也重新生成")
+    parser.add_argument("--stream", action="store_true", help="按行带流式处理（适合超大图片）")
+    parser.add_argument("-p", "--profile", default=DEFAULT_PNG_PROFILE, choices=list(PNG_PROFILES),
+                        help="PNG 编码配置：fast 最快 / balanced 平衡 / smallest 文件最小")
+    add_store_argument(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        tasks = collect_batch_tasks(args.inputs, args.output_dir, recursive=args.recursive)
+    except ValueError as e:
+        print(f"× {e}")
+        return 1
+    if not tasks:
+        print("× 没有找到PNG文件")
+        return 1
+
+    print(f"共找到 {len(tasks)} 张图片，开始处理...")
+    stats = run_batch(tasks, method=args.method, workers=args.workers,
+                      chunk_size=max(1, args.chunk_size), force=args.force, stream=args.stream,
+                      profile=args.profile, pixel_store=get_store(args.pixel_store))
+
+    seconds = max(stats["seconds"], 1e-9)
+    print(f"✓ 完成 {stats['done']} 张，跳过 {stats['skipped']} 张（已是最新），失败 {stats['failed']} 张")
+    print(f"耗时 {stats['seconds']:.2f} 秒，"
+          f"{stats['done'] / seconds:.1f} 张/秒，"
+          f"{stats['bytes'] / 1e6 / seconds:.1f} MB/秒，"
+          f"{stats['pixels'] / 1e6 / seconds:.1f} 百万像素/秒")
+    return 1 if stats["failed"] else 0
+
 if __name__ == "__main__":
+    # 带参数运行时进入批量模式：python PNG_extracted.py 输入目录 -o 输出目录 -j 8
+    if len(sys.argv) > 1:
+        sys.exit(batch_main())
     main()
\ No newline at end of file
@@ -1,6 +1,132 @@
+import os
+import sys
+import glob
+import time
+import argparse
 from PIL import Image
+from png_encoding import PNG_PROFILES, DEFAULT_PNG_PROFILE, save_png
+from instrumentation import stage, image_nbytes, load_image
+from pixel_store import get_store, add_store_argument
 
-def resize_pil(input_path, output_path, size=None, scale_factor=None, method=Image.Resampling.LANCZOS):
+# 大幅缩小时的快速路径：先用整数倍盒式滤波（reduce）缩小，中间图像至少保留
+# 目标尺寸的 REDUCING_GAP 倍，再用高质量滤波做最后一步。质量/速度取舍：
+#   None  不做预缩小，与直接 LANCZOS 完全一致，最慢
+#   3.0   与直接缩放在肉眼上无差别
+#   2.0   默认值，仅在缩小到 1/4 以下时生效，差异通常不超过 1~2 个灰度级
+#   1.0   最快，细节和锯齿略有损失
+REDUCING_GAP = 2.0
+# 带透明通道的模式
+ALPHA_MODES = ('RGBA', 'LA', 'PA', 'RGBa', 'La')
+
+def _has_alpha(img):
+    """图像是否带透明度（alpha 通道或调色板/灰度的 transparency 信息）"""
+    return img.mode in ALPHA_MODES or 'transparency' in img.info
+
+def _resize_mode(img):
+    """
+    缩放使用的模式：只有带透明度的图像才用 RGBA；RGB/L 保持原样，其余模式转为 RGB，
+    避免多余的 alpha 通道以及缩放时的预乘/反预乘运算
+    """
+    if _has_alpha(img):
+        return 'RGBA'
+    if img.mode in ('RGB', 'L'):
+        return img.mode
+    return 'RGB'
+
+def _prepare_for_resize(img, draft_size=None, input_path=None, pixel_store=None):
+    """
+    为缩放准备图像
+    - 指定 draft_size 时调用 draft()，JPEG 等格式会在解码阶段直接按 1/2、1/4、1/8 缩小
+      （结果不小于 draft_size，PNG 不支持，此时无影响）
+    - 转换为 _resize_mode 决定的模式
+    - 提供 pixel_store 和 input_path 时，像素从内存映射的 .npy 读取（首次运行时解码并写入），
+      此时不做 draft 缩小，存储的始终是全分辨率像素
+    """
+    if pixel_store is not None and input_path is not None:
+        return pixel_store.open_image(input_path, _resize_mode(img), image=img)
+    if draft_size is not None:
+        img.draft(None, draft_size)
+    load_image(img)
+    target_mode = _resize_mode(img)
+    if img.mode == target_mode:
+        return img
+    with stage("convert", image_nbytes(img)):
+        return img.convert(target_mode)
+
+def _target_size(original_size, size=None, scale_factor=None):
+    """根据 size 或 scale_factor 计算目标尺寸"""
+    if size:
+        return tuple(size)
+    if scale_factor:
+        return (int(original_size[0] * scale_factor), int(original_size[1] * scale_factor))
+    raise ValueError("必须提供 size 或 scale_factor")
+
+def resize_pil_multi(input_path, targets, method=Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP,
+                     profile=DEFAULT_PNG_PROFILE, pixel_store=None):
+    """
+    只解码一次，生成多个尺寸的缩放图（例如 1024/512/256/128 缩略图梯度）
+    目标按从大到小处理，大幅缩小时先用 reduce() 逐级减半（整数盒式滤波，很快），
+    减半后的中间图像会被后续更小的目标复用，最后一步再用 method 做高质量重采样。
+
+    :param input_path: 输入文件路径
+    :param targets: 字典 {输出路径: 目标尺寸 (width, height) 或缩放比例 float}
+    :param method: 最后一步使用的重采样方法
+    :param reducing_gap: 中间图像相对目标尺寸至少保留的倍数，设为 None 则不做逐级减半
+    :param profile: PNG 编码配置（"fast" / "balanced" / "smallest"），见 png_encoding.PNG_PROFILES
+    :param pixel_store: 可选的 PixelStore，重复处理同一图片时跳过解码
+    :return: 字典 {输出路径: 实际尺寸}
+    """
+    with Image.open(input_path) as img:
+        jobs = []
+        for output_path, target in targets.items():
+            if isinstance(target, (int, float)):
+                new_size = _target_size(img.size, scale_factor=target)
+            else:
+                new_size = _target_size(img.size, size=target)
+            jobs.append((output_path, new_size))
+        # 从大到小处理，让逐级减半的中间结果可以被后续目标复用
+        jobs.sort(key=lambda job: job[1][0] * job[1][1], reverse=True)
+
+        # 按最大的目标尺寸做解码时缩小（仅 JPEG 等格式有效）
+        img = _prepare_for_resize(img, jobs[0][1] if jobs else None, input_path, pixel_store)
+
+        base = img
+        results = {}
+        for output_path, new_size in jobs:
+            with stage("resize", image_nbytes(base)):
+                if reducing_gap:
+                    while (base.width // 2 >= new_size[0] * reducing_gap
+                           and base.height // 2 >= new_size[1] * reducing_gap):
+                        base = base.reduce(2)
+                resized_img = base.resize(new_size, resample=method)
+            save_png(resized_img, output_path, profile)
+            results[output_path] = resized_img.size
+
+    print(f"已从 {input_path} 生成 {len(results)} 个尺寸: "
+          + ", ".join(f"{w}x{h}" for w, h in results.values()))
+    return results
+
+def thumbnail_ladder(input_path, output_pattern, long_edges=(1024, 512, 256, 128), method=Image.Resampling.LANCZOS,
+                     profile=DEFAULT_PNG_PROFILE, pixel_store=None):
+    """
+    保持宽高比生成缩略图梯度
+    :param input_path: 输入文件路径
+    :param output_pattern: 输出路径模板，例如 "thumb_{size}.png"
+    :param long_edges: 各缩略图的长边像素数
+    :param profile: PNG 编码配置
+    :param pixel_store: 可选的 PixelStore，见 resize_pil_multi
+    :return: 字典 {输出路径: 实际尺寸}
+    """
+    with Image.open(input_path) as img:
+        width, height = img.size
+    targets = {}
+    for edge in long_edges:
+        ratio = edge / max(width, height)
+        targets[output_pattern.format(size=edge)] = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+    return resize_pil_multi(input_path, targets, method=method, profile=profile, pixel_store=pixel_store)
+
+def resize_pil(input_path, output_path, size=None, scale_factor=None, method=Image.Resampling.LANCZOS,
+               reducing_gap=REDUCING_GAP, profile=DEFAULT_PNG_PROFILE, pixel_store=None):
     """
     使用 Pillow 缩放 PNG 图像
     
@@ -9,34 +135,32 @@ def resize_pil(input_path, output_path, size=None, scale_factor=None, method=Ima
     :param size: 目标尺寸 (width, height)，例如 (800, 600)
     :param scale_factor: 缩放比例 (0.5 表示缩小一半, 2.0 表示放大一倍)
     :param method: 重采样方法，控制缩放质量
+    :param reducing_gap: 大幅缩小时的快速路径参数，取舍见 REDUCING_GAP；None 表示始终全分辨率重采样
+    :param profile: PNG 编码配置（"fast" / "balanced" / "smallest"），"smallest" 在原来的 optimize=True 基础上改用 Z_FILTERED 策略
+    :param pixel_store: 可选的 PixelStore，重复处理同一图片时跳过解码
     """
     try:
         with Image.open(input_path) as img:
-            # 确保图像是 RGBA 模式以保留透明度
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
             original_width, original_height = img.size
             
             # 计算新的尺寸
-            if size:
-                new_size = size
-            elif scale_factor:
-                new_size = (int(original_width * scale_factor), int(original_height * scale_factor))
-            else:
-                raise ValueError("必须提供 size 或 scale_factor")
+            new_size = _target_size(img.size, size, scale_factor)
             
             print(f"原始尺寸: {original_width}x{original_height}")
             print(f"目标尺寸: {new_size[0]}x{new_size[1]}")
             
+            # 解码时缩小（JPEG）；只有带透明度的图像才转为 RGBA
+            img = _prepare_for_resize(img, new_size, input_path, pixel_store)
+            
             # 执行缩放
             # Image.Resampling.LANCZOS: 高质量缩小
             # Image.Resampling.BICUBIC: 平衡质量和速度
             # Image.Resampling.BILINEAR: 快速，质量较低
-            resized_img = img.resize(new_size, resample=method)
+            with stage("resize", image_nbytes(img)):
+                resized_img = img.resize(new_size, resample=method, reducing_gap=reducing_gap)
             
-            # 保存图像，优化PNG压缩
-            resized_img.save(output_path, 'PNG', optimize=True)
+            # 按编码配置保存，在文件大小和耗时之间取舍
+            save_png(resized_img, output_path, profile)
             print(f"图像已成功保存至: {output_path}")
             
     except FileNotFoundError:
@@ -44,8 +168,56 @@ def resize_pil(input_path, output_path, size=None, scale_factor=None, method=Ima
     except Exception as e:
         print(f"发生错误: {e}")
 
+def _expand_inputs(inputs, recursive=False):
+    """把文件、目录或通配符展开为图片路径列表"""
+    paths = []
+    for spec in inputs:
+        if os.path.isdir(spec):
+            spec = os.path.join(spec, "**", "*.png") if recursive else os.path.join(spec, "*.png")
+        paths.extend(p for p in sorted(glob.glob(spec, recursive=recursive)) if os.path.isfile(p))
+    return list(dict.fromkeys(paths))
+
+def batch_main(argv=None):
+    """批量生成缩略图梯度的命令行入口"""
+    parser = argparse.ArgumentParser(description="批量生成PNG缩略图梯度")
+    parser.add_argument("inputs", nargs="+", help="输入文件、目录或通配符")
+    parser.add_argument("-o", "--output-dir", default="thumbnails", help="输出目录")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+", default=[1024, 512, 256, 128],
+                        help="缩略图长边像素数")
+    parser.add_argument("-p", "--profile", default=DEFAULT_PNG_PROFILE, choices=list(PNG_PROFILES),
+                        help="PNG 编码配置：fast 最快 / balanced 平衡 / smallest 文件最小")
+    parser.add_argument("-r", "--recursive", action="store_true", help="递归搜索子目录")
+    add_store_argument(parser)
+    args = parser.parse_args(argv)
+
+    paths = _expand_inputs(args.inputs, recursive=args.recursive)
+    if not paths:
+        print("× 没有找到PNG文件")
+        return 1
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    pixel_store = get_store(args.pixel_store)
+    failed = 0
+    start_time = time.perf_counter()
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        pattern = os.path.join(args.output_dir, stem + "_{size}.png")
+        try:
+            thumbnail_ladder(path, pattern, long_edges=args.sizes, profile=args.profile, pixel_store=pixel_store)
+        except Exception as e:
+            failed += 1
+            print(f"× {path}: {e}")
+    seconds = max(time.perf_counter() - start_time, 1e-9)
+    print(f"✓ 完成 {len(paths) - failed} 张，失败 {failed} 张，"
+          f"耗时 {seconds:.2f} 秒（{len(paths) / seconds:.1f} 张/秒，编码配置: {args.profile}）")
+    return 1 if failed else 0
+
 # --- 使用示例 ---
 if __name__ == "__main__":
+    # 带参数运行时进入批量模式：python PNG_scale.py 输入目录 -o 输出目录 -p fast
+    if len(sys.argv) > 1:
+        sys.exit(batch_main())
+
     input_file = "input.png"
     output_file_resize = "output_resize.png"
     output_file_scale = "output_scale.png"
@@ -60,13 +232,13 @@ if __name__ == "__main__":
     # 示例 3: 保持宽高比缩放 (使用 thumbnail 方法)
     def resize_keep_aspect_ratio(input_path, output_path, base_width):
         with Image.open(input_path) as img:
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
+            img = _prepare_for_resize(img)
                 
             w_percent = (base_width / float(img.size[0]))
             h_size = int((float(img.size[1]) * float(w_percent)))
-            img.thumbnail((base_width, h_size), Image.Resampling.LANCZOS)
-            img.save(output_path, 'PNG', optimize=True)
+            with stage("resize", image_nbytes(img)):
+                img.thumbnail((base_width, h_size), Image.Resampling.LANCZOS)
+            save_png(img, output_path, "smallest")
             print(f"保持宽高比缩放完成，新尺寸: {img.size}")
 
     resize_keep_aspect_ratio(input_file, "output_thumbnail.png", 400)
\ No newline at end of file
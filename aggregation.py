@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+# 可以从各组合分组的结果合并出来的统计量（只需一次分组）
+MERGEABLE_METRICS = ('count', 'sum', 'mean', 'std', 'var', 'min', 'max')
+
+def _as_list(names):
+    return [names] if isinstance(names, str) else list(names)
+
+def _joint_moments(frame, keys, values, metrics):
+    """
+    一次分组：在所有分组键的组合上计算每个数值列的 个数、均值、总体方差（需要时）、最小值、最大值（需要时）
+    组合的数量只是各分组键取值个数的乘积，后续按单个键汇总时只处理这张小表
+    """
+    # 保留键为空的组合：某个键为空的行仍然要计入其他键的统计
+    grouped = frame.groupby(keys, observed=True, sort=True, dropna=False)[values]
+    joint = {'n': grouped.count(), 'mean': grouped.mean()}
+    if 'std' in metrics or 'var' in metrics:
+        joint['var0'] = grouped.var(ddof=0)
+    for name in ('min', 'max'):
+        if name in metrics:
+            joint[name] = getattr(grouped, name)()
+    return joint
+
+def _merge_moments(joint, key, column):
+    """把组合分组的统计量按单个分组键合并（并行方差合并公式，数值稳定）"""
+    n_i = joint['n'][column]
+    mean_i = joint['mean'][column]
+    level = n_i.index.names.index(key) if isinstance(n_i.index, pd.MultiIndex) else 0
+
+    def by_key(series):
+        return series.groupby(level=level, observed=True, sort=True)
+
+    n = by_key(n_i).sum()
+    total = by_key(n_i * mean_i.fillna(0)).sum()
+    merged = {'count': n, 'sum': total, 'mean': total / n.where(n > 0)}
+    if 'var0' in joint:
+        # M2 = Σ n_i·var_i + Σ n_i·(mean_i - mean)²
+        mean_b = merged['mean'].reindex(n_i.index.get_level_values(level)).to_numpy()
+        spread = n_i * joint['var0'][column].fillna(0) + n_i * (mean_i.fillna(0) - mean_b) ** 2
+        merged['var'] = by_key(spread).sum() / (n - 1).where(n > 1)
+        merged['std'] = np.sqrt(merged['var'])
+    for name in ('min', 'max'):
+        if name in joint:
+            merged[name] = getattr(by_key(joint[name][column]), name)()
+    return merged
+
+def aggregate(df, keys, values, metrics=('count', 'mean', 'std'), quantiles=()):
+    """
+    声明式分组统计：在多个分组键上、对多个数值列一次计算多个统计量
+    分组键统一转为 category 类型；可合并的统计量（见 MERGEABLE_METRICS）只对数据分组一次，
+    各键的结果从组合分组的小表合并得到；分位数无法合并，每个分组键需要各自分组一次。
+    :param df: 数据 DataFrame
+    :param keys: 分组键列名（一个或多个），如 ['性别', '工龄段']
+    :param values: 统计的数值列名（一个或多个），如 ['白细胞计数']
+    :param metrics: 统计量，取自 MERGEABLE_METRICS
+    :param quantiles: 分位数，如 (0.25, 0.5, 0.75)，结果的统计量名为 q25 / q50 / q75
+    :return: 整洁格式的 DataFrame，列为 key, group, column, metric, value（每个统计值一行）
+    """
+    keys, values = _as_list(keys), _as_list(values)
+    unknown = [m for m in metrics if m not in MERGEABLE_METRICS]
+    if unknown:
+        raise ValueError(f"不支持的统计量: {', '.join(unknown)}（可选 {', '.join(MERGEABLE_METRICS)}）")
+
+    frame = df[keys + values].copy()
+    for key in keys:
+        if not isinstance(frame[key].dtype, pd.CategoricalDtype):
+            frame[key] = frame[key].astype('category')
+
+    parts = []
+    joint = _joint_moments(frame, keys, values, metrics) if metrics else None
+    for key in keys:
+        for column in values:
+            if joint is not None:
+                merged = _merge_moments(joint, key, column)
+                for metric in metrics:
+                    parts.append(_tidy(merged[metric], key, column, metric))
+            if quantiles:
+                q = frame.groupby(key, observed=True, sort=True)[column].quantile(list(quantiles))
+                for p in quantiles:
+                    parts.append(_tidy(q.xs(p, level=-1), key, column, f'q{round(p * 100):g}'))
+    return pd.concat(parts, ignore_index=True)
+
+def _tidy(series, key, column, metric):
+    return pd.DataFrame({'key': key, 'group': series.index.astype(object), 'column': column,
+                         'metric': metric, 'value': series.to_numpy(dtype='float64')})
+
+def select_metric(result, key, column, metric):
+    """
+    从 aggregate 的整洁结果中取出一个报表，如各性别的白细胞计数均值
+    :return: 以分组为索引的 Series（索引名为分组键，名称为数值列名），可直接打印或画图
+    """
+    rows = result[(result['key'] == key) & (result['column'] == column) & (result['metric'] == metric)]
+    return pd.Series(rows['value'].to_numpy(), index=pd.Index(rows['group'], name=key), name=column)
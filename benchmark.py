@@ -0,0 +1,324 @@
+import os
+import io
+import sys
+import csv
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import contextlib
+import importlib.util
+from datetime import datetime
+import numpy as np
+from PIL import Image
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+# 默认的图片尺寸和模式（I;16 为 16 位灰度）
+DEFAULT_SIZES = ("640x480", "1920x1080", "4000x3000")
+DEFAULT_MODES = ("RGB", "RGBA", "L", "I;16")
+DEFAULT_REPEATS = 5
+# 比较模式下，中位耗时变慢超过这个比例视为性能回退
+DEFAULT_TOLERANCE = 0.10
+# 比较模式下，峰值内存增加超过这个比例视为内存回退
+DEFAULT_MEMORY_TOLERANCE = 0.10
+DEFAULT_IMAGE_DIR = os.path.join(tempfile.gettempdir(), "png_tools_bench")
+# 结果中用于匹配基线的字段
+CASE_FIELDS = ("bench", "mode", "width", "height")
+RESULT_FIELDS = CASE_FIELDS + ("megapixels", "repeats", "best_s", "median_s", "mpix_per_s", "peak_rss_mb")
+
+def _load_module(name, relative_path):
+    """按文件路径加载脚本（文件名含空格或中文，不能直接 import）"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPT_DIR, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB）；无法获取时返回 None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为 KB，macOS 为字节
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil  # Windows 上通过 psutil 获取峰值工作集
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    except (ImportError, AttributeError):
+        return None
+
+# ---------- 合成测试图片 ----------
+
+def make_synthetic_image(width, height, mode):
+    """
+    用 create_test_image 生成的图案放大到指定尺寸，叠加固定种子的轻微噪声
+    （纯色块压缩率高得不真实，加噪声后 PNG 编解码的耗时更接近真实照片），再转换为指定模式
+    """
+    from PNG_extracted import create_test_image
+    base = create_test_image().resize((width, height), Image.Resampling.BICUBIC)
+    rng = np.random.default_rng(0)
+    noisy = np.asarray(base, dtype=np.int16) + rng.integers(-8, 9, (height, width, 3), dtype=np.int16)
+    base = Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8))
+    if mode == "I;16":
+        return Image.fromarray(np.asarray(base.convert("L"), dtype=np.uint16) * 257)
+    if mode == "RGBA":
+        image = base.convert("RGBA")
+        image.putalpha(Image.linear_gradient("L").resize((width, height)))
+        return image
+    return base.convert(mode)
+
+def synthetic_image_path(image_dir, width, height, mode):
+    """返回合成图片的路径，不存在时生成（同样的参数只生成一次）"""
+    name = f"bench_{width}x{height}_{mode.replace(';', '')}.png"
+    path = os.path.join(image_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(image_dir, exist_ok=True)
+        make_synthetic_image(width, height, mode).save(path, "PNG", compress_level=6)
+    return path
+
+# ---------- 各热点路径 ----------
+# 每个基准返回一个无参函数，只计时这个函数；准备工作（读取图片、建立图表等）不计入
+
+def bench_extract_luminance(path, work_dir):
+    from PNG_extracted import extract_luminance
+    image = Image.open(path)
+    image.load()
+    return lambda: extract_luminance(image)
+
+def bench_resize_pil(path, work_dir):
+    from PNG_scale import resize_pil
+    output_path = os.path.join(work_dir, "resize_pil.png")
+    return lambda: resize_pil(path, output_path, scale_factor=0.5)
+
+def bench_resize_image(path, work_dir):
+    scaler = _load_module("png_image_scaler", os.path.join("python-proj", "python-proj", "PNG图像缩放.py"))
+    output_path = os.path.join(work_dir, "resize_image.png")
+    return lambda: scaler.resize_image(path, output_path, scale=0.5)
+
+def bench_analyze_brightness(path, work_dir):
+    """BrightnessAnalyzer.analyze_brightness 的工作内容：加载灰度图与预览金字塔，再统计分析"""
+    bp = _load_module("brightness_pixels", "brightness pixels .py")
+
+    def run():
+        image, pyramid = bp.load_image_pyramid(path)
+        return bp.analyze_image(image, 200, None, path, pyramid)
+    return run
+
+def bench_chart(path, work_dir):
+    """图表路径：用新的分析结果更新图元并完整渲染一次（Agg 后端，不需要显示器）"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    bp = _load_module("brightness_pixels", "brightness pixels .py")
+    image, pyramid = bp.load_image_pyramid(path)
+    result, preview = bp.analyze_image(image, 200, None, path, pyramid)
+    figure = bp.BrightnessFigure()
+    canvas = FigureCanvasAgg(figure.fig)
+
+    def run():
+        figure.update(preview, result)
+        canvas.draw()
+    return run
+
+BENCHMARKS = {
+    "extract_luminance": bench_extract_luminance,
+    "resize_pil": bench_resize_pil,
+    "resize_image": bench_resize_image,
+    "analyze_brightness": bench_analyze_brightness,
+    "chart": bench_chart,
+}
+
+# ---------- 运行 ----------
+
+def run_case(bench, width, height, mode, repeats=DEFAULT_REPEATS, image_dir=DEFAULT_IMAGE_DIR):
+    """
+    在当前进程中运行一个基准（预热一次，再计时 repeats 次）
+    合成图片应事先由 run_suite 在父进程中生成，否则生成过程也会计入本进程的峰值内存
+    :return: 结果字典，字段见 RESULT_FIELDS
+    """
+    path = synthetic_image_path(image_dir, width, height, mode)
+    with tempfile.TemporaryDirectory() as work_dir:
+        # 被测函数自己的 ✓ 提示不计入输出
+        with contextlib.redirect_stdout(io.StringIO()):
+            run = BENCHMARKS[bench](path, work_dir)
+            run()
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+    megapixels = width * height / 1e6
+    median = statistics.median(times)
+    peak = peak_rss_mb()
+    return {
+        "bench": bench, "mode": mode, "width": width, "height": height,
+        "megapixels": round(megapixels, 3), "repeats": repeats,
+        "best_s": round(min(times), 6), "median_s": round(median, 6),
+        "mpix_per_s": round(megapixels / median, 3),
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+    }
+
+def run_case_isolated(bench, width, height, mode, repeats, image_dir):
+    """在独立的子进程中运行一个基准，使峰值内存只反映这一个用例"""
+    cmd = [sys.executable, os.path.abspath(__file__), "--case", bench, f"{width}x{height}", mode,
+           "--repeats", str(repeats), "--image-dir", image_dir]
+    completed = subprocess.run(cmd, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "子进程失败")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def run_suite(benches, sizes, modes, repeats=DEFAULT_REPEATS, image_dir=DEFAULT_IMAGE_DIR):
+    """运行全部组合，逐个打印进度，返回结果列表"""
+    # 先在父进程中生成全部合成图片，子进程只读取，峰值内存不包含生成图片的开销
+    for width, height in sizes:
+        for mode in modes:
+            synthetic_image_path(image_dir, width, height, mode)
+    results = []
+    for bench in benches:
+        for width, height in sizes:
+            for mode in modes:
+                size = f"{width}x{height}"
+                label = f"{bench:<20} {size:<10} {mode:<5}"
+                try:
+                    row = run_case_isolated(bench, width, height, mode, repeats, image_dir)
+                except Exception as e:
+                    print(f"× {label} 失败: {e}")
+                    continue
+                results.append(row)
+                print(f"✓ {label} 中位 {row['median_s'] * 1000:9.2f} ms  "
+                      f"{row['mpix_per_s']:8.2f} 百万像素/秒  峰值内存 {row['peak_rss_mb']} MB")
+    return results
+
+# ---------- 基线读写与比较 ----------
+
+def save_results(results, output_path):
+    """保存结果：.csv 为纯表格，其他扩展名为带运行环境信息的 JSON"""
+    if output_path.lower().endswith(".csv"):
+        with open(output_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+        return
+    meta = {
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pillow": Image.__version__,
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=2)
+
+def load_results(path):
+    """读取 save_results 保存的 CSV 或 JSON"""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            row["width"], row["height"] = int(row["width"]), int(row["height"])
+            row["median_s"] = float(row["median_s"])
+            row["peak_rss_mb"] = float(row["peak_rss_mb"]) if row.get("peak_rss_mb") else None
+        return rows
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+def _ratio_flag(ratio, tolerance, label):
+    """比值超出 tolerance 时返回标记文字"""
+    if ratio > 1 + tolerance:
+        return f"  × {label}回退"
+    if ratio < 1 - tolerance:
+        return f"  ✓ {label}提升"
+    return ""
+
+def compare_results(baseline, current, tolerance=DEFAULT_TOLERANCE, memory_tolerance=DEFAULT_MEMORY_TOLERANCE):
+    """
+    按 (基准, 模式, 宽, 高) 匹配两组结果并打印耗时和峰值内存的比值
+    任一方缺少峰值内存（无法获取）时只比较耗时
+    :return: (耗时回退的用例数, 内存回退的用例数)，分别以 tolerance 和 memory_tolerance 判定
+    """
+    old = {tuple(row[k] for k in CASE_FIELDS): row for row in baseline}
+    regressions = memory_regressions = 0
+    print(f"\n{'基准':<20} {'尺寸':<10} {'模式':<5} {'基线(ms)':>10} {'当前(ms)':>10} {'比值':>7} "
+          f"{'基线(MB)':>10} {'当前(MB)':>10} {'内存比':>7}")
+    for row in current:
+        key = tuple(row[k] for k in CASE_FIELDS)
+        if key not in old:
+            continue
+        before, after = float(old[key]["median_s"]), float(row["median_s"])
+        ratio = after / before if before > 0 else float("inf")
+        flag = _ratio_flag(ratio, tolerance, "耗时")
+        if flag.startswith("  ×"):
+            regressions += 1
+        memory = f"{'-':>10} {'-':>10} {'-':>7}"
+        mem_before, mem_after = old[key].get("peak_rss_mb"), row.get("peak_rss_mb")
+        if mem_before and mem_after:
+            mem_before, mem_after = float(mem_before), float(mem_after)
+            mem_ratio = mem_after / mem_before
+            memory_flag = _ratio_flag(mem_ratio, memory_tolerance, "内存")
+            if memory_flag.startswith("  ×"):
+                memory_regressions += 1
+            memory = f"{mem_before:>10.1f} {mem_after:>10.1f} {mem_ratio:>7.2f}"
+            flag += memory_flag
+        size = f"{row['width']}x{row['height']}"
+        print(f"{row['bench']:<20} {size:<10} {row['mode']:<5} "
+              f"{before * 1000:>10.2f} {after * 1000:>10.2f} {ratio:>7.2f} {memory}{flag}")
+    return regressions, memory_regressions
+
+def _parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="图像热点路径基准测试（离线，使用合成图片）")
+    parser.add_argument("-b", "--bench", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help="要运行的基准（默认全部）")
+    parser.add_argument("-s", "--sizes", nargs="+", default=list(DEFAULT_SIZES), help="图片尺寸，如 1920x1080")
+    parser.add_argument("-m", "--modes", nargs="+", default=list(DEFAULT_MODES), help="图片模式：RGB RGBA L I;16")
+    parser.add_argument("-n", "--repeats", type=int, default=DEFAULT_REPEATS, help="每个用例计时次数")
+    parser.add_argument("-o", "--output", help="保存结果（.json 或 .csv），可作为以后比较的基线")
+    parser.add_argument("-c", "--compare", help="与之前保存的基线比较，有回退时返回码为 1")
+    parser.add_argument("--current", help="与 --compare 一起使用：直接比较两份结果文件，不重新运行")
+    parser.add_argument("-t", "--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="判定耗时回退的相对阈值（默认 0.10，即慢 10%%）")
+    parser.add_argument("--memory-tolerance", type=float, default=DEFAULT_MEMORY_TOLERANCE,
+                        help="判定峰值内存回退的相对阈值（默认 0.10，即多用 10%%）")
+    parser.add_argument("--image-dir", default=DEFAULT_IMAGE_DIR, help="合成图片的存放目录")
+    parser.add_argument("--case", nargs=3, metavar=("BENCH", "SIZE", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        # 子进程入口：运行单个用例，最后一行输出 JSON 结果
+        bench, size, mode = args.case
+        print(json.dumps(run_case(bench, *_parse_size(size), mode, args.repeats, args.image_dir)))
+        return 0
+
+    if args.current:
+        if not args.compare:
+            parser.error("--current 需要与 --compare 一起使用")
+        results = load_results(args.current)
+    else:
+        sizes = [_parse_size(s) for s in args.sizes]
+        results = run_suite(args.bench, sizes, args.modes, max(1, args.repeats), args.image_dir)
+        if args.output:
+            save_results(results, args.output)
+            print(f"✓ 结果已保存到: {args.output}")
+
+    if args.compare:
+        regressions, memory_regressions = compare_results(load_results(args.compare), results,
+                                                          args.tolerance, args.memory_tolerance)
+        if regressions:
+            print(f"× {regressions} 个用例耗时回退超过 {args.tolerance:.0%}")
+        if memory_regressions:
+            print(f"× {memory_regressions} 个用例峰值内存回退超过 {args.memory_tolerance:.0%}")
+        if regressions or memory_regressions:
+            return 1
+        print("✓ 没有发现性能回退")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,471 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox
+import os
+import sys
+import csv
+import json
+import glob
+import time
+import argparse
+import threading
+import queue
+from dataclasses import dataclass, field
+from functools import partial
 from PIL import Image
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import pandas as pd
 from datetime import datetime
+from instrumentation import stage, image_nbytes, load_image
+from pixel_store import get_store, add_store_argument
+from pixel_buffer import as_array
+
+# 界面相关的重量级模块（tkinter、matplotlib）在首次打开界面或图表时才由 load_gui_modules 导入，
+# 批量模式和被其他脚本导入时完全不会加载它们；pandas 也只在需要 DataFrame 时导入。
+# 启动预算（python -X importtime 统计的模块导入总耗时）：无界面路径 < 200 ms（实测约 140 ms，
+# 其中 numpy 约占 95 ms；之前在模块顶层导入 tkinter/matplotlib/pandas 时约 900 ms）
+tk = filedialog = messagebox = ttk = None
+Figure = Patch = Wedge = FigureCanvasTkAgg = None
+
+def load_chart_modules():
+    """导入绘制图表所需的 matplotlib 模块（不需要 Tk，无界面环境也可以画图）"""
+    global Figure, Patch, Wedge
+    if Figure is not None:
+        return
+    from matplotlib.figure import Figure
+    from matplotlib.patches import Patch, Wedge
+
+def load_gui_modules():
+    """导入界面和图表所需的模块（只在第一次调用时真正导入）"""
+    global tk, filedialog, messagebox, ttk, FigureCanvasTkAgg
+    load_chart_modules()
+    if tk is not None:
+        return
+    import tkinter
+    from tkinter import filedialog, messagebox, ttk
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    tk = tkinter
+
+# 亮度分级的固定边界（阈值之外）
+VERY_BRIGHT_LEVEL = 220
+MEDIUM_LEVEL = 128
+DIM_LEVEL = 64
+# 报告中给出的百分位
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+# 直方图按行分块统计，每块之间报告进度、检查是否取消
+HISTOGRAM_BLOCK_ROWS = 256
+# 热力图预览尺寸
+PREVIEW_SIZE = (200, 200)
+# 主线程轮询后台结果的间隔（毫秒），约 60 fps
+POLL_INTERVAL_MS = 16
+# 拖动阈值滑块时的防抖间隔（毫秒）：停顿这么久才刷新一次统计和图表
+LIVE_DEBOUNCE_MS = 30
+
+class AnalysisCancelled(Exception):
+    """后台任务被用户取消"""
+
+def _check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise AnalysisCancelled()
+
+def load_grayscale(image_path, progress=None, cancel_event=None, pixel_store=None):
+    """
+    读取图片并转换为灰度图（可在后台线程中运行）
+    提供 pixel_store 时灰度像素从内存映射的 .npy 读取（首次运行时解码并写入），得到的图像是只读的
+    """
+    if pixel_store is not None:
+        image = pixel_store.open_image(image_path, 'L')
+    else:
+        image = load_image(Image.open(image_path))
+        with stage("convert", image_nbytes(image)):
+            image = image.convert('L')
+    _check_cancelled(cancel_event)
+    if progress is not None:
+        progress(1.0)
+    return image
+
+def compute_histogram(pixels, progress=None, cancel_event=None):
+    """
+    一次遍历像素，得到 256 级亮度直方图（后续所有统计都从它推导）
+    pixels 可以是灰度 uint8 数组，也可以是 L 模式 PIL 图像：后者由 Pillow 直接在自身内存上统计，
+    不必先把整幅像素复制成数组。
+    按行分块统计，可通过 progress(比例) 报告进度，cancel_event 置位时抛出 AnalysisCancelled；
+    图像输入且两者都不需要时整幅一次统计。
+    """
+    histogram = np.zeros(256, dtype=np.int64)
+    if isinstance(pixels, Image.Image):
+        rows, nbytes = pixels.height, image_nbytes(pixels)
+        # 图像的行带裁剪只复制一个行带；数组按行块统计，限制 bincount 内部转换出的临时数组大小
+        block_rows = max(rows, 1) if progress is None and cancel_event is None else HISTOGRAM_BLOCK_ROWS
+    else:
+        rows, nbytes = pixels.shape[0], pixels.nbytes
+        block_rows = HISTOGRAM_BLOCK_ROWS
+    with stage("stats", nbytes):
+        for start in range(0, rows, block_rows):
+            _check_cancelled(cancel_event)
+            stop = min(start + block_rows, rows)
+            if not isinstance(pixels, Image.Image):
+                histogram += np.bincount(pixels[start:stop].ravel(), minlength=256)[:256]
+            elif block_rows >= rows:
+                histogram += pixels.histogram()
+            else:
+                histogram += pixels.crop((0, start, pixels.width, stop)).histogram()
+            if progress is not None:
+                progress(stop / rows)
+    return histogram
+
+def make_preview(image, preview_size=PREVIEW_SIZE):
+    """生成热力图预览用的小尺寸数组（先缩小再用 as_array 导出，只复制缩小后的像素）"""
+    if image.width > preview_size[0] or image.height > preview_size[1]:
+        with stage("resize", image_nbytes(image)):
+            image = image.resize(preview_size)
+    return as_array(image)
+
+class PreviewPyramid:
+    """
+    灰度图的多分辨率金字塔，加载图片时构建一次
+    第 0 级直接引用原图对象，之后每级用 reduce(2) 缩小一半，直到再缩小就会小于
+    预览尺寸为止。热力图预览、缩放查看和快速预估统计都从合适的级别取数据，
+    不必每次分析都从原图缩放。
+    注意任何一级转成 numpy 数组（np.asarray / as_array）都会复制一次：Pillow 只能通过
+    tobytes() 导出像素。因此预览只在缩小后的级别上导出并缓存，统计直接在 PIL 图像上进行。
+    """
+    
+    def __init__(self, image, min_size=PREVIEW_SIZE):
+        self.levels = [image]
+        level = image
+        with stage("resize", image_nbytes(image)):
+            while level.width // 2 >= min_size[0] and level.height // 2 >= min_size[1]:
+                level = level.reduce(2)
+                self.levels.append(level)
+        self._previews = {}
+    
+    def level_for(self, size):
+        """返回不小于 size (宽, 高) 的最小一级；原图本身更小时返回原图"""
+        for level in reversed(self.levels):
+            if level.width >= size[0] and level.height >= size[1]:
+                return level
+        return self.levels[0]
+    
+    def preview(self, preview_size=PREVIEW_SIZE):
+        """热力图预览数组，从最接近的级别缩放得到，按尺寸缓存"""
+        if preview_size not in self._previews:
+            self._previews[preview_size] = make_preview(self.level_for(preview_size), preview_size)
+        return self._previews[preview_size]
+    
+    def quick_stats(self, threshold):
+        """用最小一级的直方图快速预估统计（像素数为缩小后的数量）"""
+        return brightness_stats(compute_histogram(self.levels[-1]), threshold)
+
+def load_image_pyramid(image_path, progress=None, cancel_event=None, pixel_store=None):
+    """后台加载灰度图并构建预览金字塔，返回 (灰度图, PreviewPyramid)"""
+    image = load_grayscale(image_path, cancel_event=cancel_event, pixel_store=pixel_store)
+    pyramid = PreviewPyramid(image)
+    _check_cancelled(cancel_event)
+    if progress is not None:
+        progress(1.0)
+    return image, pyramid
+
+def histogram_percentile(cdf, total, q):
+    """由累积直方图求百分位：累积像素数首次达到 q% 的亮度值"""
+    return int(np.searchsorted(cdf, q / 100 * total, side='left'))
+
+def brightness_stats(histogram, threshold):
+    """
+    从 256 级直方图推导全部亮度统计，复杂度 O(256)，与图片大小无关
+    :param histogram: compute_histogram 的结果
+    :param threshold: 亮像素阈值（> threshold 为亮像素）
+    :return: 统计结果字典
+    """
+    total_pixels = int(histogram.sum())
+    levels = np.arange(256)
+    nonzero = np.flatnonzero(histogram)
+    cdf = np.cumsum(histogram)
+
+    mean_brightness = float((levels * histogram).sum() / total_pixels)
+    std_brightness = float(np.sqrt((histogram * (levels - mean_brightness) ** 2).sum() / total_pixels))
+    bright_pixels = int(histogram[threshold + 1:].sum())
+
+    return {
+        'total_pixels': total_pixels,
+        'bright_pixels': bright_pixels,
+        'dark_pixels': total_pixels - bright_pixels,
+        'bright_percentage': bright_pixels / total_pixels * 100,
+        # 更详细的亮度分级
+        'very_bright': int(histogram[VERY_BRIGHT_LEVEL + 1:].sum()),
+        'bright': int(histogram[threshold + 1:VERY_BRIGHT_LEVEL + 1].sum()),
+        'medium': int(histogram[MEDIUM_LEVEL + 1:threshold + 1].sum()),
+        'dim': int(histogram[DIM_LEVEL + 1:MEDIUM_LEVEL + 1].sum()),
+        'very_dark': int(histogram[:DIM_LEVEL + 1].sum()),
+        # 亮度统计
+        'mean_brightness': mean_brightness,
+        'max_brightness': int(nonzero[-1]),
+        'min_brightness': int(nonzero[0]),
+        'std_brightness': std_brightness,
+        'percentiles': {q: histogram_percentile(cdf, total_pixels, q) for q in PERCENTILES},
+    }
+
+# 导出时按此顺序输出的统计字段
+RESULT_STAT_FIELDS = ('total_pixels', 'bright_pixels', 'dark_pixels', 'bright_percentage',
+                      'very_bright', 'bright', 'medium', 'dim', 'very_dark',
+                      'mean_brightness', 'max_brightness', 'min_brightness', 'std_brightness')
+
+@dataclass
+class BrightnessResult:
+    """
+    一次亮度分析的结构化结果
+    界面显示、图表和各种导出（CSV/JSON/Parquet）都直接读取这里的数值，
+    同时保留完整的 256 级直方图，换阈值时可用 with_threshold 重新推导。
+    """
+    image_path: str
+    width: int
+    height: int
+    threshold: int
+    total_pixels: int
+    bright_pixels: int
+    dark_pixels: int
+    bright_percentage: float
+    very_bright: int
+    bright: int
+    medium: int
+    dim: int
+    very_dark: int
+    mean_brightness: float
+    max_brightness: int
+    min_brightness: int
+    std_brightness: float
+    percentiles: dict
+    histogram: np.ndarray = field(repr=False)
+    analyzed_at: str = field(default_factory=lambda: datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    
+    @classmethod
+    def from_histogram(cls, image_path, size, histogram, threshold):
+        """
+        由直方图生成分析结果
+        :param image_path: 图片路径
+        :param size: 图片尺寸 (宽, 高)
+        :param histogram: compute_histogram 的结果
+        :param threshold: 亮像素阈值
+        """
+        stats = brightness_stats(histogram, threshold)
+        return cls(image_path=image_path, width=size[0], height=size[1], threshold=threshold,
+                   histogram=histogram, **stats)
+    
+    def with_threshold(self, threshold):
+        """同一张图片换阈值：只从直方图重算统计，O(256)"""
+        return BrightnessResult.from_histogram(self.image_path, (self.width, self.height),
+                                               self.histogram, threshold)
+    
+    def to_row(self, include_histogram=True):
+        """
+        转换为一行扁平的数值记录（CSV / Parquet / DataFrame 使用）
+        百分位展开为 p1..p99 列，直方图展开为 hist_0..hist_255 列
+        """
+        row = {'file': self.image_path, 'width': self.width, 'height': self.height,
+               'threshold': self.threshold}
+        for name in RESULT_STAT_FIELDS:
+            row[name] = getattr(self, name)
+        row.update({f'p{q}': v for q, v in self.percentiles.items()})
+        row['analyzed_at'] = self.analyzed_at
+        if include_histogram:
+            row.update({f'hist_{level}': int(count) for level, count in enumerate(self.histogram)})
+        return row
+    
+    def to_dict(self):
+        """转换为可直接 JSON 序列化的字典（直方图保留为长度 256 的列表）"""
+        record = {'file': self.image_path, 'width': self.width, 'height': self.height,
+                  'threshold': self.threshold}
+        for name in RESULT_STAT_FIELDS:
+            record[name] = getattr(self, name)
+        record['percentiles'] = {str(q): v for q, v in self.percentiles.items()}
+        record['histogram'] = self.histogram.tolist()
+        record['analyzed_at'] = self.analyzed_at
+        return record
+
+def analyze_image(image, threshold, histogram=None, image_path=None, pyramid=None,
+                  progress=None, cancel_event=None):
+    """
+    完整的亮度分析流程，不依赖 Tk，可在后台线程中运行
+    :param image: 灰度 PIL Image对象
+    :param threshold: 亮像素阈值
+    :param histogram: 已有的直方图（同一张图片换阈值时传入，可跳过像素遍历）
+    :param image_path: 图片路径，记录在结果中
+    :param pyramid: 加载时构建的 PreviewPyramid，有则直接取缓存的预览
+    :return: (BrightnessResult, 预览数组)
+    """
+    if histogram is None:
+        histogram = compute_histogram(image, progress, cancel_event)
+    result = BrightnessResult.from_histogram(image_path, image.size, histogram, threshold)
+    _check_cancelled(cancel_event)
+    preview = pyramid.preview() if pyramid is not None else make_preview(image)
+    return result, preview
+
+# 亮度分级的饼图颜色（从亮到暗）
+BAND_COLORS = ['gold', 'yellowgreen', 'lightcoral', 'lightskyblue', 'lightgray']
+
+class BrightnessFigure:
+    """
+    亮度图表的 Figure 及其图元，不依赖 Tk
+    Figure、坐标轴和颜色条只创建一次，update 只替换各图元的数据；
+    界面中由 BrightnessChart 嵌入窗口显示，无界面时可直接保存或在基准测试中渲染。
+    """
+    
+    def __init__(self):
+        load_chart_modules()
+        # 不经过 pyplot，Figure 不会被注册到全局，关闭窗口即可释放
+        self.fig = Figure(figsize=(12, 8))
+        self.fig.suptitle('PNG图片亮度分析图表', fontsize=16, fontweight='bold')
+        (self.ax1, self.ax2), (self.ax3, self.ax4) = self.fig.subplots(2, 2)
+        levels = np.arange(256)
+        zeros = np.zeros(256)
+        
+        # 1. 亮度直方图：每个亮度值一级，直接使用 256 级直方图
+        self.hist_patch = self.ax1.stairs(zeros, np.arange(257) - 0.5, fill=True,
+                                          color='skyblue', alpha=0.7)
+        self.hist_line = self.ax1.axvline(x=0, color='red', linestyle='--', linewidth=2)
+        self.hist_legend = self.ax1.legend([self.hist_line], ['阈值'], loc='upper left')
+        self.ax1.set_title('亮度值分布直方图')
+        self.ax1.set_xlabel('亮度值 (0-255)')
+        self.ax1.set_ylabel('像素数量')
+        self.ax1.set_xlim(-1, 256)
+        self.ax1.grid(True, alpha=0.3)
+        
+        # 2. 亮度饼图：固定 5 个扇区，更新时只改角度和文字，大小为 0 的扇区隐藏
+        self.wedges, self.wedge_labels, self.wedge_pcts = [], [], []
+        for color in BAND_COLORS:
+            self.wedges.append(self.ax2.add_patch(Wedge((0, 0), 1, 0, 0, facecolor=color)))
+            self.wedge_labels.append(self.ax2.text(0, 0, '', va='center'))
+            self.wedge_pcts.append(self.ax2.text(0, 0, '', ha='center', va='center'))
+        self.ax2.set_xlim(-1.3, 1.3)
+        self.ax2.set_ylim(-1.2, 1.2)
+        self.ax2.set_aspect('equal')
+        self.ax2.set_axis_off()
+        self.ax2.set_title('亮度等级分布')
+        
+        # 3. 累积分布函数：由直方图累加得到，只需 256 个点
+        self.levels = levels
+        (self.cdf_line,) = self.ax3.plot(levels, zeros, color='purple', linewidth=2, drawstyle='steps-post')
+        self.cdf_threshold_line = self.ax3.axvline(x=0, color='red', linestyle='--', linewidth=2)
+        self.cdf_fill = None
+        self.cdf_legend = self.ax3.legend([self.cdf_threshold_line, Patch(color='red', alpha=0.3)],
+                                          ['阈值', '>'], loc='upper left')
+        self.ax3.set_title('亮度累积分布函数')
+        self.ax3.set_xlabel('亮度值')
+        self.ax3.set_ylabel('累积概率')
+        self.ax3.set_xlim(-1, 256)
+        self.ax3.set_ylim(0, 1.02)
+        self.ax3.grid(True, alpha=0.3)
+        
+        # 4. 亮度热力图预览
+        self.preview = self.ax4.imshow(np.zeros((2, 2), dtype=np.uint8), cmap='gray', aspect='auto')
+        self.ax4.set_title('图片亮度预览')
+        self.fig.colorbar(self.preview, ax=self.ax4, shrink=0.8)
+        
+        self.fig.tight_layout()
+    
+    def update(self, preview_img, result):
+        """用新的分析结果（BrightnessResult）原地更新所有图元（不重绘）"""
+        threshold = result.threshold
+        histogram = result.histogram
+        # 1. 直方图
+        self.hist_patch.set_data(histogram)
+        self.ax1.set_ylim(0, max(1, histogram.max()) * 1.05)
+        self.hist_line.set_xdata([threshold, threshold])
+        self.hist_legend.get_texts()[0].set_text(f'阈值: {threshold}')
+        
+        # 2. 饼图：从 90° 开始逆时针排列，大小为0的项隐藏
+        labels = ['很亮\n(>220)', f'较亮\n({threshold}-220)', f'中等\n(128-{threshold})', '较暗\n(64-128)', '很暗\n(≤64)']
+        sizes = [result.very_bright, result.bright, result.medium, result.dim, result.very_dark]
+        total = sum(sizes)
+        theta = 90.0
+        for wedge, label, pct, text, size in zip(self.wedges, self.wedge_labels, self.wedge_pcts, labels, sizes):
+            span = 360.0 * size / total
+            mid = np.deg2rad(theta + span / 2)
+            x, y = np.cos(mid), np.sin(mid)
+            wedge.set_theta1(theta)
+            wedge.set_theta2(theta + span)
+            label.set(position=(1.1 * x, 1.1 * y), text=text, ha='left' if x > 0 else 'right')
+            pct.set(position=(0.6 * x, 0.6 * y), text=f'{span / 3.6:.1f}%')
+            for artist in (wedge, label, pct):
+                artist.set_visible(size > 0)
+            theta += span
+        
+        # 3. 累积分布函数
+        cdf = np.cumsum(histogram) / result.total_pixels
+        self.cdf_line.set_ydata(cdf)
+        self.cdf_threshold_line.set_xdata([threshold, threshold])
+        if self.cdf_fill is not None:
+            self.cdf_fill.remove()
+        self.cdf_fill = self.ax3.fill_between(self.levels, cdf, where=(self.levels > threshold), step='post',
+                                              alpha=0.3, color='red')
+        legend_texts = self.cdf_legend.get_texts()
+        legend_texts[0].set_text(f'阈值: {threshold}')
+        legend_texts[1].set_text(f'> {threshold}')
+        
+        # 4. 预览图
+        self.preview.set_data(preview_img)
+        self.preview.set_extent((-0.5, preview_img.shape[1] - 0.5, preview_img.shape[0] - 0.5, -0.5))
+        self.preview.set_clim(preview_img.min(), preview_img.max())
+
+
+class BrightnessChart:
+    """
+    持久的亮度图表窗口
+    Figure、坐标轴、颜色条和画布只创建一次；每次分析只替换各图元的数据，
+    再用 draw_idle 请求重绘，因此反复分析时耗时为毫秒级，内存也不会增长。
+    """
+    
+    def __init__(self, root):
+        load_gui_modules()
+        self.window = tk.Toplevel(root)
+        self.window.title("亮度分布图表")
+        self.window.geometry("900x700")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        self.figure = BrightnessFigure()
+        self.fig = self.figure.fig
+        
+        # 将图表嵌入到Tkinter窗口
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self.window)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        
+        # 添加关闭按钮
+        close_btn = tk.Button(self.window, text="关闭图表", command=self.close,
+                             bg="#f44336", fg="white", font=("Arial", 10))
+        close_btn.pack(pady=10)
+    
+    def is_open(self):
+        return self.window is not None
+    
+    def close(self):
+        if self.window is not None:
+            self.window.destroy()
+            self.window = None
+            self.fig.clear()
+    
+    def update(self, preview_img, result):
+        """用新的分析结果（BrightnessResult）原地更新所有图元并请求重绘"""
+        # 实际绘制由 Tk 空闲时完成，这里只统计更新图元的耗时
+        with stage("plot"):
+            self.figure.update(preview_img, result)
+        self.canvas.draw_idle()
 
 class BrightnessAnalyzer:
     def __init__(self, root):
+        load_gui_modules()
         self.root = root
         self.root.title("PNG图片亮度像素分析器")
         self.root.geometry("800x600")
         
         self.image_path = None
         self.image_data = None
+        self.pyramid = None  # 加载时构建的预览金字塔（PreviewPyramid）
+        self.result = None  # 最近一次的分析结果（BrightnessResult），含直方图，换阈值时无需重新遍历像素
+        self.pixel_store = get_store()  # 由环境变量 PNG_TOOLS_PIXEL_STORE 开启，再次打开同一图片时跳过解码
+        self.chart = None  # 持久的图表窗口（BrightnessChart）
+        self.preview = None  # 最近一次分析的预览数组，实时模式下复用
+        self.live_job = None  # 实时模式下等待执行的 after 任务
+        
+        # 后台任务：工作线程只通过队列把结果交回主线程
+        self.worker = None
+        self.cancel_event = None
+        self.results = queue.Queue()
         
         self.setup_ui()
     
@@ -45,6 +496,28 @@ class BrightnessAnalyzer:
         tk.Button(param_frame, text="开始分析", command=self.analyze_brightness,
                  bg="#2196F3", fg="white", font=("Arial", 10)).pack(side=tk.LEFT)
         
+        # 后台任务进度与取消
+        self.cancel_button = tk.Button(param_frame, text="取消", command=self.cancel_task,
+                                       state=tk.DISABLED, font=("Arial", 10))
+        self.cancel_button.pack(side=tk.LEFT, padx=(10, 0))
+        self.progress_var = tk.DoubleVar(value=0)
+        ttk.Progressbar(param_frame, variable=self.progress_var, maximum=100,
+                        length=150).pack(side=tk.LEFT, padx=(10, 0))
+        self.status_label = tk.Label(param_frame, text="", fg="gray")
+        self.status_label.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # 阈值滑块：实时模式下直接从缓存的直方图重算统计，无需重新遍历像素
+        slider_frame = tk.Frame(main_frame)
+        slider_frame.pack(fill=tk.X, pady=(0, 10))
+        self.live_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(slider_frame, text="实时更新", variable=self.live_var).pack(side=tk.LEFT)
+        self.threshold_scale = tk.Scale(slider_frame, from_=0, to=255, orient=tk.HORIZONTAL,
+                                        showvalue=False, command=self.on_threshold_slide)
+        self.threshold_scale.set(int(self.threshold_var.get()))
+        self.threshold_scale.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
+        # 输入框 -> 滑块：输入合法阈值时移动滑块（滑块 -> 输入框见 on_threshold_slide）
+        self.threshold_var.trace_add("write", self.on_threshold_entry)
+        
         # 结果显示区域
         result_frame = tk.LabelFrame(main_frame, text="分析结果", padx=5, pady=5)
         result_frame.pack(fill=tk.BOTH, expand=True)
@@ -64,7 +537,7 @@ class BrightnessAnalyzer:
         save_frame = tk.Frame(main_frame)
         save_frame.pack(fill=tk.X, pady=(10, 0))
         
-        tk.Button(save_frame, text="保存数据到CSV", command=self.save_to_csv,
+        tk.Button(save_frame, text="保存数据 (CSV/JSON/Parquet)", command=self.save_to_csv,
                  bg="#FF9800", fg="white", font=("Arial", 10)).pack(side=tk.LEFT)
         
         tk.Button(save_frame, text="导出分析报告", command=self.export_report,
@@ -85,23 +558,103 @@ class BrightnessAnalyzer:
         )
         
         if file_path:
-            self.image_path = file_path
-            filename = file_path.split("/")[-1] if "/" in file_path else file_path.split("\\")[-1]
-            self.file_label.config(text=f"已选择: {filename}", fg="green")
-            self.load_image()
+            self.load_image(file_path)
+    
+    # ---------- 后台任务 ----------
+    
+    def _start_task(self, message, func, on_done, *args):
+        """在工作线程中执行 func(*args)，完成后在主线程调用 on_done(结果)"""
+        if self.worker is not None and self.worker.is_alive():
+            messagebox.showwarning("警告", "后台任务正在运行，请等待完成或先取消")
+            return False
+        
+        self.cancel_event = threading.Event()
+        self.progress_var.set(0)
+        self.status_label.config(text=message, fg="gray")
+        self.cancel_button.config(state=tk.NORMAL)
+        self.worker = threading.Thread(target=self._run_task, daemon=True,
+                                       args=(func, args, on_done, self.cancel_event))
+        self.worker.start()
+        self.root.after(POLL_INTERVAL_MS, self._poll_results)
+        return True
     
-    def load_image(self):
-        """加载图片"""
+    def _run_task(self, func, args, on_done, cancel_event):
+        """工作线程入口：不直接访问任何 Tk 控件，只向队列发送消息"""
+        def progress(fraction):
+            self.results.put(('progress', fraction, None))
+        
         try:
-            self.image_data = Image.open(self.image_path).convert('L')  # 转换为灰度图
-            self.result_text.insert(tk.END, f"✓ 成功加载图片: {self.image_path}\n")
-            self.result_text.insert(tk.END, f"✓ 图片尺寸: {self.image_data.size}\n")
-            self.result_text.insert(tk.END, "-" * 50 + "\n")
+            result = func(*args, progress=progress, cancel_event=cancel_event)
+            _check_cancelled(cancel_event)
+            self.results.put(('done', result, on_done))
+        except AnalysisCancelled:
+            self.results.put(('cancelled', None, None))
         except Exception as e:
-            messagebox.showerror("错误", f"无法加载图片: {str(e)}")
+            self.results.put(('error', e, None))
+    
+    def _poll_results(self):
+        """主线程定时轮询队列，更新进度并处理任务结果"""
+        finished = False
+        try:
+            while not finished:
+                kind, value, on_done = self.results.get_nowait()
+                if kind == 'progress':
+                    self.progress_var.set(value * 100)
+                else:
+                    finished = True
+                    self._finish_task(kind, value, on_done)
+        except queue.Empty:
+            pass
+        if not finished:
+            self.root.after(POLL_INTERVAL_MS, self._poll_results)
+    
+    def _finish_task(self, kind, value, on_done):
+        self.cancel_button.config(state=tk.DISABLED)
+        if kind == 'done':
+            self.progress_var.set(100)
+            self.status_label.config(text="完成", fg="green")
+            on_done(value)
+        elif kind == 'cancelled':
+            self.progress_var.set(0)
+            self.status_label.config(text="已取消", fg="gray")
+        else:
+            self.progress_var.set(0)
+            self.status_label.config(text="出错", fg="red")
+            messagebox.showerror("错误", f"处理过程中出现错误: {str(value)}")
+    
+    def cancel_task(self):
+        """请求取消当前后台任务"""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.status_label.config(text="正在取消...", fg="gray")
+    
+    # ---------- 加载与分析 ----------
+    
+    def load_image(self, file_path):
+        """
+        在后台线程加载图片
+        加载成功后才替换 image_path；任务未能启动、被取消或失败时仍保留之前的图片和结果
+        """
+        self._start_task("正在加载图片...", partial(load_image_pyramid, pixel_store=self.pixel_store),
+                         partial(self._on_image_loaded, file_path), file_path)
+    
+    def _on_image_loaded(self, file_path, loaded):
+        self.image_path = file_path
+        self.image_data, self.pyramid = loaded  # 转换后的灰度图及其预览金字塔
+        filename = os.path.basename(file_path)
+        self.file_label.config(text=f"已选择: {filename}", fg="green")
+        self.result = None
+        self.preview = None
+        self.result_text.insert(tk.END, f"✓ 成功加载图片: {self.image_path}\n")
+        self.result_text.insert(tk.END, f"✓ 图片尺寸: {self.image_data.size}\n")
+        # 从金字塔最小一级快速预估，正式分析前先给出大致结果
+        quick = self.pyramid.quick_stats(int(self.threshold_scale.get()))
+        self.result_text.insert(tk.END, f"✓ 快速预估: 平均亮度 {quick['mean_brightness']:.1f}，"
+                                        f"亮像素占比约 {quick['bright_percentage']:.1f}%\n")
+        self.result_text.insert(tk.END, "-" * 50 + "\n")
     
     def analyze_brightness(self):
-        """分析图片亮度"""
+        """分析图片亮度（像素统计在后台线程进行）"""
         if not self.image_path or not self.image_data:
             messagebox.showwarning("警告", "请先选择图片文件！")
             return
@@ -111,38 +664,92 @@ class BrightnessAnalyzer:
             threshold = int(self.threshold_var.get())
             if not (0 <= threshold <= 255):
                 raise ValueError("阈值必须在0-255之间")
-            
-            # 转换为numpy数组
-            img_array = np.array(self.image_data)
-            
-            # 计算各种亮度统计
-            total_pixels = img_array.size
-            bright_pixels = np.sum(img_array > threshold)
-            dark_pixels = np.sum(img_array <= threshold)
-            bright_percentage = (bright_pixels / total_pixels) * 100
-            
-            # 更详细的亮度分级
-            very_bright = np.sum(img_array > 220)
-            bright = np.sum((img_array > threshold) & (img_array <= 220))
-            medium = np.sum((img_array > 128) & (img_array <= threshold))
-            dim = np.sum((img_array > 64) & (img_array <= 128))
-            very_dark = np.sum(img_array <= 64)
-            
-            # 亮度统计
-            mean_brightness = np.mean(img_array)
-            max_brightness = np.max(img_array)
-            min_brightness = np.min(img_array)
-            std_brightness = np.std(img_array)
-            
-            # 清空之前的结果
-            self.result_text.delete(1.0, tk.END)
-            
-            # 显示结果
-            result_str = f"""
+        except ValueError as e:
+            messagebox.showerror("错误", f"参数错误: {str(e)}")
+            return
+        
+        # 直方图每张图片只算一次，所有统计都由它推导
+        histogram = self.result.histogram if self.result is not None else None
+        self._start_task("正在分析亮度...", analyze_image, self._on_analysis_done,
+                         self.image_data, threshold, histogram, self.image_path, self.pyramid)
+    
+    def on_threshold_entry(self, *args):
+        """输入框内容变化：是 0-255 的整数且与滑块不同时移动滑块（输入未完成时不动）"""
+        try:
+            threshold = int(self.threshold_var.get())
+        except ValueError:
+            return
+        if 0 <= threshold <= 255 and threshold != int(self.threshold_scale.get()):
+            self.threshold_scale.set(threshold)
+    
+    def on_threshold_slide(self, value):
+        """
+        滑块移动：同步输入框，并在实时模式下防抖刷新
+        Tk 在空闲时才调用滑块的 command，程序调用 set() 之后同样会触发；
+        滑块值与当前结果的阈值相同时说明无需重算，直接忽略
+        """
+        threshold = int(float(value))
+        try:
+            typed = int(self.threshold_var.get())
+        except ValueError:
+            typed = None
+        if typed != threshold:
+            self.threshold_var.set(str(threshold))
+        if self.live_job is not None:
+            self.root.after_cancel(self.live_job)
+            self.live_job = None
+        if not self.live_var.get() or self.result is None or self.result.threshold == threshold:
+            return
+        self.live_job = self.root.after(LIVE_DEBOUNCE_MS, self._apply_live_threshold)
+    
+    def _apply_live_threshold(self):
+        """从缓存的直方图增量重算（O(256)），更新文本和图表"""
+        self.live_job = None
+        if self.result is None:
+            return
+        self.result = self.result.with_threshold(int(self.threshold_scale.get()))
+        self.show_results(self.result)
+        # 只刷新仍打开的图表窗口，用户关闭后拖动滑块不会重新弹出
+        if self.preview is not None and self.chart is not None and self.chart.is_open():
+            self.chart.update(self.preview, self.result)
+    
+    def _on_analysis_done(self, analysis):
+        self.result, self.preview = analysis
+        self.threshold_scale.set(self.result.threshold)
+        try:
+            self.show_results(self.result)
+            # 生成图表
+            self.plot_brightness_chart(self.preview, self.result)
+        except Exception as e:
+            messagebox.showerror("错误", f"分析过程中出现错误: {str(e)}")
+    
+    def show_results(self, result):
+        """在文本框中显示分析结果（BrightnessResult）"""
+        threshold = result.threshold
+        total_pixels = result.total_pixels
+        bright_pixels = result.bright_pixels
+        dark_pixels = result.dark_pixels
+        bright_percentage = result.bright_percentage
+        very_bright = result.very_bright
+        bright = result.bright
+        medium = result.medium
+        dim = result.dim
+        very_dark = result.very_dark
+        mean_brightness = result.mean_brightness
+        max_brightness = result.max_brightness
+        min_brightness = result.min_brightness
+        std_brightness = result.std_brightness
+        percentiles_str = ", ".join(f"P{q}={v}" for q, v in result.percentiles.items())
+        
+        # 清空之前的结果
+        self.result_text.delete(1.0, tk.END)
+        
+        # 显示结果
+        result_str = f"""
 🎯 PNG图片亮度像素分析报告
 {'='*60}
-📁 文件路径: {self.image_path}
-🖼️  图片尺寸: {self.image_data.size[0]} × {self.image_data.size[1]}
+📁 文件路径: {result.image_path}
+🖼️  图片尺寸: {result.width} × {result.height}
 ⚙️  分析阈值: > {threshold} (定义为亮像素)
 
 📊 基本统计:
@@ -151,6 +758,7 @@ class BrightnessAnalyzer:
 • 最大亮度: {max_brightness}/255
 • 最小亮度: {min_brightness}/255
 • 亮度标准差: {std_brightness:.2f}
+• 亮度百分位: {percentiles_str}
 
 💡 亮度分类统计:
 • 很亮像素 (>220): {very_bright:,} ({very_bright/total_pixels*100:.2f}%)
@@ -165,124 +773,34 @@ class BrightnessAnalyzer:
 • 亮像素占比: {bright_percentage:.2f}%
 • 暗像素占比: {(100-bright_percentage):.2f}%
 
-⏰ 分析时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+⏰ 分析时间: {result.analyzed_at}
 """
 
-            self.result_text.insert(tk.END, result_str)
-            
-            # 生成图表
-            self.plot_brightness_chart(img_array, threshold)
-            
-        except ValueError as e:
-            messagebox.showerror("错误", f"参数错误: {str(e)}")
-        except Exception as e:
-            messagebox.showerror("错误", f"分析过程中出现错误: {str(e)}")
+        self.result_text.insert(tk.END, result_str)
     
-    def plot_brightness_chart(self, img_array, threshold):
-        """绘制亮度分布图表"""
-        # 清除之前的图表
-        for widget in self.root.winfo_children():
-            if isinstance(widget, tk.Toplevel):
-                widget.destroy()
-        
-        # 创建新窗口显示图表
-        chart_window = tk.Toplevel(self.root)
-        chart_window.title("亮度分布图表")
-        chart_window.geometry("900x700")
-        
-        fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(12, 8))
-        fig.suptitle('PNG图片亮度分析图表', fontsize=16, fontweight='bold')
-        
-        # 1. 亮度直方图
-        ax1.hist(img_array.flatten(), bins=50, color='skyblue', alpha=0.7, edgecolor='black')
-        ax1.axvline(x=threshold, color='red', linestyle='--', linewidth=2, label=f'阈值: {threshold}')
-        ax1.set_title('亮度值分布直方图')
-        ax1.set_xlabel('亮度值 (0-255)')
-        ax1.set_ylabel('像素数量')
-        ax1.legend()
-        ax1.grid(True, alpha=0.3)
-        
-        # 2. 亮度饼图
-        labels = ['很亮\n(>220)', f'较亮\n({threshold}-220)', '中等\n(128-200)', '较暗\n(64-128)', '很暗\n(≤64)']
-        sizes = [
-            np.sum(img_array > 220),
-            np.sum((img_array > threshold) & (img_array <= 220)),
-            np.sum((img_array > 128) & (img_array <= threshold)),
-            np.sum((img_array > 64) & (img_array <= 128)),
-            np.sum(img_array <= 64)
-        ]
-        colors = ['gold', 'yellowgreen', 'lightcoral', 'lightskyblue', 'lightgray']
-        
-        # 过滤掉大小为0的项
-        non_zero_labels = [labels[i] for i in range(len(sizes)) if sizes[i] > 0]
-        non_zero_sizes = [sizes[i] for i in range(len(sizes)) if sizes[i] > 0]
-        non_zero_colors = [colors[i] for i in range(len(colors)) if sizes[i] > 0]
-        
-        ax2.pie(non_zero_sizes, labels=non_zero_labels, colors=non_zero_colors, autopct='%1.1f%%', startangle=90)
-        ax2.set_title('亮度等级分布')
-        
-        # 3. 累积分布函数
-        sorted_pixels = np.sort(img_array.flatten())
-        y_vals = np.arange(len(sorted_pixels)) / float(len(sorted_pixels))
-        ax3.plot(sorted_pixels, y_vals, color='purple', linewidth=2)
-        ax3.axvline(x=threshold, color='red', linestyle='--', linewidth=2, label=f'阈值: {threshold}')
-        ax3.fill_between(sorted_pixels, y_vals, where=(sorted_pixels > threshold), 
-                        alpha=0.3, color='red', label=f'> {threshold}')
-        ax3.set_title('亮度累积分布函数')
-        ax3.set_xlabel('亮度值')
-        ax3.set_ylabel('累积概率')
-        ax3.legend()
-        ax3.grid(True, alpha=0.3)
-        
-        # 4. 亮度热力图预览
-        preview_size = (200, 200)  # 缩小尺寸用于预览
-        preview_img = img_array.copy()
-        if preview_img.shape[0] > preview_size[1] or preview_img.shape[1] > preview_size[0]:
-            preview_img = np.array(Image.fromarray(preview_img).resize(preview_size))
-        
-        im = ax4.imshow(preview_img, cmap='gray', aspect='auto')
-        ax4.set_title('图片亮度预览')
-        plt.colorbar(im, ax=ax4, shrink=0.8)
-        
-        plt.tight_layout()
-        
-        # 将图表嵌入到Tkinter窗口
-        canvas = FigureCanvasTkAgg(fig, master=chart_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-        
-        # 添加关闭按钮
-        close_btn = tk.Button(chart_window, text="关闭图表", command=chart_window.destroy,
-                             bg="#f44336", fg="white", font=("Arial", 10))
-        close_btn.pack(pady=10)
+    def plot_brightness_chart(self, preview_img, result):
+        """绘制亮度分布图表（所需数据已在后台线程准备好）"""
+        # 图表窗口只创建一次，之后原地更新数据
+        if self.chart is None or not self.chart.is_open():
+            self.chart = BrightnessChart(self.root)
+        self.chart.update(preview_img, result)
     
     def save_to_csv(self):
-        """保存数据到CSV文件"""
-        if not hasattr(self, 'result_text'):
+        """保存分析数据（CSV / JSON / Parquet，按扩展名选择格式），数值直接取自分析结果"""
+        if self.result is None:
             messagebox.showwarning("警告", "请先进行亮度分析！")
             return
         
         try:
             file_path = filedialog.asksaveasfilename(
-                title="保存CSV数据",
+                title="保存分析数据",
                 defaultextension=".csv",
-                filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+                filetypes=[("CSV files", "*.csv"), ("JSON files", "*.json"),
+                           ("Parquet files", "*.parquet"), ("All files", "*.*")]
             )
             
             if file_path:
-                # 从文本框中提取数据并保存到CSV
-                content = self.result_text.get(1.0, tk.END)
-                
-                # 这里可以添加更复杂的数据提取逻辑
-                data = {
-                    '项目': ['总像素', '亮像素', '暗像素', '亮像素占比', '平均亮度'],
-                    '数值': [content.count('总像素数量'), content.count('亮像素总数'), 
-                           content.count('暗像素总数'), content.count('亮像素占比'),
-                           content.count('平均亮度')]
-                }
-                
-                df = pd.DataFrame(data)
-                df.to_csv(file_path, index=False, encoding='utf-8-sig')
+                export_results([self.result], file_path)
                 
                 messagebox.showinfo("成功", f"数据已保存到: {file_path}")
                 
@@ -317,10 +835,220 @@ class BrightnessAnalyzer:
         except Exception as e:
             messagebox.showerror("错误", f"导出失败: {str(e)}")
 
+# ---------------- 批量分析（无界面） ----------------
+
+DEFAULT_THRESHOLD = 200
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+# Parquet 输出每攒够这么多行写一个行组
+PARQUET_ROW_GROUP = 1000
+
+def iter_image_paths(inputs, recursive=False):
+    """把目录、文件或通配符展开为图片路径列表"""
+    paths = []
+    for spec in inputs:
+        if os.path.isdir(spec):
+            pattern = os.path.join(spec, "**", "*") if recursive else os.path.join(spec, "*")
+        else:
+            pattern = spec
+        for path in sorted(glob.glob(pattern, recursive=recursive)):
+            if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(path)
+    return list(dict.fromkeys(paths))
+
+def analyze_file(image_path, threshold=DEFAULT_THRESHOLD, pixel_store=None):
+    """
+    分析单个图片文件，返回 BrightnessResult（与界面中的分析相同）
+    可在工作进程中运行，不依赖 Tk；pixel_store 见 load_grayscale
+    """
+    image = load_grayscale(image_path, pixel_store=pixel_store)
+    histogram = compute_histogram(image)
+    return BrightnessResult.from_histogram(image_path, image.size, histogram, threshold)
+
+def _analyze_chunk(paths, threshold, pixel_store=None):
+    """工作进程入口：分析一组文件，失败的文件返回错误信息"""
+    results = []
+    for path in paths:
+        try:
+            results.append((path, analyze_file(path, threshold, pixel_store), None))
+        except Exception as e:
+            results.append((path, None, str(e)))
+    return results
+
+def iter_batch_results(paths, threshold=DEFAULT_THRESHOLD, workers=None, chunk_size=8, pixel_store=None):
+    """
+    用进程池并行分析，按完成顺序逐个产出 (路径, BrightnessResult或None, 错误信息或None)
+    同时在途的任务数有上限，结果产生后即可写出，无需等待全部完成
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    workers = workers or os.cpu_count() or 1
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        next_chunk = 0
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < workers * 2:
+                pending.add(executor.submit(_analyze_chunk, chunks[next_chunk], threshold, pixel_store))
+                next_chunk += 1
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield from future.result()
+
+# 结果文件支持的格式（按扩展名判断，没有扩展名时为 csv）
+RESULT_FORMATS = ('csv', 'json', 'jsonl', 'parquet')
+
+def result_format(output_path):
+    """由结果文件的扩展名得到格式名，如 "results.jsonl" -> "jsonl" """
+    return os.path.splitext(output_path)[1].lower().lstrip('.') or 'csv'
+
+class ResultSink:
+    """
+    把 BrightnessResult 流式写入 CSV、JSON、JSON Lines 或 Parquet（按扩展名判断）
+    CSV / JSON Lines 逐行追加；JSON 边写边输出数组元素，不在内存中攒整个列表；
+    Parquet 按 PARQUET_ROW_GROUP 行为一组写入（需要 pyarrow）。
+    CSV / Parquet 中直方图展开为 hist_0..hist_255 列，JSON 中为列表。
+    """
+    
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.format = result_format(output_path)
+        if self.format not in RESULT_FORMATS:
+            raise ValueError(f"不支持的输出格式: .{self.format}（可选 .csv/.json/.jsonl/.parquet）")
+        self.is_parquet = self.format == 'parquet'
+        self._file = None
+        self._writer = None
+        self._buffer = []
+        self._count = 0
+    
+    def write(self, result):
+        if self.is_parquet:
+            self._buffer.append(result.to_row())
+            if len(self._buffer) >= PARQUET_ROW_GROUP:
+                self._flush_parquet()
+            return
+        if self.format == 'csv':
+            row = result.to_row()
+            if self._writer is None:
+                self._file = open(self.output_path, 'w', newline='', encoding='utf-8-sig')
+                self._writer = csv.DictWriter(self._file, fieldnames=list(row))
+                self._writer.writeheader()
+            self._writer.writerow(row)
+        else:
+            if self._file is None:
+                self._file = open(self.output_path, 'w', encoding='utf-8')
+            record = json.dumps(result.to_dict(), ensure_ascii=False)
+            if self.format == 'jsonl':
+                self._file.write(record + '\n')
+            else:
+                self._file.write(('[\n' if self._count == 0 else ',\n') + record)
+        self._count += 1
+        self._file.flush()
+    
+    def _flush_parquet(self):
+        if not self._buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(self._buffer)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.output_path, table.schema)
+        self._writer.write_table(table)
+        self._buffer = []
+    
+    def close(self):
+        if self.is_parquet:
+            self._flush_parquet()
+        if self.is_parquet and self._writer is not None:
+            self._writer.close()
+        if self.format == 'json':
+            if self._file is None:
+                self._file = open(self.output_path, 'w', encoding='utf-8')
+            self._file.write('[]\n' if self._count == 0 else '\n]\n')
+        if self._file is not None:
+            self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def export_results(results, output_path):
+    """把若干 BrightnessResult 导出到文件，格式由扩展名决定（见 ResultSink）"""
+    with ResultSink(output_path) as sink:
+        for result in results:
+            sink.write(result)
+
+def run_batch_analysis(paths, output_path=None, threshold=DEFAULT_THRESHOLD, workers=None,
+                       chunk_size=8, progress=True, pixel_store=None):
+    """
+    批量分析图片，结果边完成边写入 output_path（.csv / .json / .jsonl / .parquet）
+    提供 pixel_store 时重复分析同一批图片会跳过解码，见 pixel_store.PixelStore
+    :return: 包含全部结果的 pandas DataFrame（每张图片一行，不含直方图列）
+    """
+    import pandas as pd
+    sink = ResultSink(output_path) if output_path else None
+    rows = []
+    failed = 0
+    start_time = time.perf_counter()
+    try:
+        results = iter_batch_results(paths, threshold, workers, chunk_size, pixel_store)
+        for i, (path, result, error) in enumerate(results, 1):
+            if error is not None:
+                failed += 1
+                print(f"× {path}: {error}", file=sys.stderr)
+                continue
+            rows.append(result.to_row(include_histogram=False))
+            if sink is not None:
+                sink.write(result)
+            if progress and (i % 100 == 0 or i == len(paths)):
+                elapsed = time.perf_counter() - start_time
+                print(f"已完成 {i}/{len(paths)}（{i / max(elapsed, 1e-9):.1f} 张/秒）")
+    finally:
+        if sink is not None:
+            sink.close()
+    if failed:
+        print(f"× {failed} 张图片分析失败", file=sys.stderr)
+    return pd.DataFrame(rows)
+
+def batch_main(argv=None):
+    """无界面的批量分析命令行入口，可在没有显示器的服务器上运行"""
+    parser = argparse.ArgumentParser(description="批量分析图片亮度（无界面）")
+    parser.add_argument("inputs", nargs="+", help="图片目录、文件或通配符")
+    parser.add_argument("-o", "--output", default="brightness_results.csv",
+                        help="输出文件（.csv / .json / .jsonl / .parquet）")
+    parser.add_argument("-t", "--threshold", type=int, default=DEFAULT_THRESHOLD, help="亮像素阈值 (0-255)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="工作进程数（默认CPU核数）")
+    parser.add_argument("--chunk-size", type=int, default=8, help="每个提交任务包含的图片数")
+    parser.add_argument("-r", "--recursive", action="store_true", help="递归搜索子目录")
+    add_store_argument(parser)
+    args = parser.parse_args(argv)
+    
+    if not (0 <= args.threshold <= 255):
+        parser.error("阈值必须在0-255之间")
+    if result_format(args.output) not in RESULT_FORMATS:
+        parser.error(f"不支持的输出格式: {args.output}（可选 .csv/.json/.jsonl/.parquet）")
+    paths = iter_image_paths(args.inputs, recursive=args.recursive)
+    if not paths:
+        print("× 没有找到图片文件")
+        return 1
+    
+    print(f"共找到 {len(paths)} 张图片，开始分析...")
+    start_time = time.perf_counter()
+    df = run_batch_analysis(paths, args.output, threshold=args.threshold,
+                            workers=args.workers, chunk_size=max(1, args.chunk_size),
+                            pixel_store=get_store(args.pixel_store))
+    seconds = time.perf_counter() - start_time
+    print(f"✓ 已分析 {len(df)} 张图片，耗时 {seconds:.2f} 秒，结果已保存到: {args.output}")
+    return 0 if len(df) == len(paths) else 1
+
 def main():
+    load_gui_modules()
     root = tk.Tk()
     app = BrightnessAnalyzer(root)
     root.mainloop()
 
 if __name__ == "__main__":
+    # 带参数运行时进入无界面的批量模式："python brightness pixels .py" 图片目录 -o 结果.csv
+    if len(sys.argv) > 1:
+        sys.exit(batch_main())
     main()
\ No newline at end of file
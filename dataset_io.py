@@ -0,0 +1,328 @@
+import os
+import json
+import hashlib
+import tempfile
+import warnings
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+
+# 列式缓存目录，可通过环境变量 DATASET_CACHE_DIR 修改
+DEFAULT_CACHE_DIR = os.environ.get(
+    "DATASET_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "dataset_tools"),
+)
+
+# 读取时显式指定的列类型（只对实际读取到的列生效）
+#   身份证号按字符串读取，避免被当成数字丢掉末尾的 X 或变成科学计数法
+#   性别取值很少，用 category 节省内存、加快分组
+DATASET_DTYPES = {'身份证号': 'string', '性别': 'category'}
+# 读取后一次性转换为数值的列，无法解析的脏数据变为 NaN；缓存中保存的已是转换后的类型
+NUMERIC_COLUMNS = ('体检年份', '白细胞计数')
+EXCEL_EXTENSIONS = ('.xls', '.xlsx', '.xlsm')
+# 分块读取时每块的行数
+DEFAULT_CHUNK_ROWS = 100_000
+# object 列中 Parquet 能直接保存的取值类型（pandas.api.types.infer_dtype 的结果），其余视为混合类型
+PARQUET_OBJECT_TYPES = ('empty', 'string', 'bytes', 'boolean', 'integer', 'floating', 'decimal',
+                        'date', 'datetime')
+
+def choose_engine(file_path):
+    """
+    选择 read_excel 的解析引擎
+    安装了 python-calamine（Rust 实现）时优先使用，通常比 xlrd/openpyxl 快数倍；
+    否则 .xls 用 xlrd，.xlsx 用 openpyxl
+    """
+    try:
+        import python_calamine  # noqa: F401
+        return 'calamine'
+    except ImportError:
+        pass
+    return 'xlrd' if file_path.lower().endswith('.xls') else 'openpyxl'
+
+def _digest(payload):
+    text = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+def cache_key(file_path, **params):
+    """
+    生成缓存文件名（不含扩展名）
+    前半部分由源文件路径和读取参数决定，后半部分由源文件大小和修改时间决定；
+    源文件更新后，同一前缀的旧缓存会在下次写入时被清理
+    """
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    return f"{_digest({'path': path, 'params': params})}-{_digest([stat.st_size, stat.st_mtime_ns])}"
+
+def _find_cache(cache_dir, key):
+    """返回已有缓存文件的路径，没有时返回 None"""
+    for ext in ('.parquet', '.pkl'):
+        path = os.path.join(cache_dir, key + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+def _read_cache(cache_dir, key):
+    path = _find_cache(cache_dir, key)
+    if path is None:
+        return None
+    try:
+        return pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+    except Exception:
+        return None
+
+def _write_cache(df, cache_dir, key):
+    """
+    原子地写入列式缓存（临时文件 + os.replace），并删除同一源文件、同一读取参数的旧缓存
+    优先写 Parquet；没有 pyarrow 时退回 pickle（混合类型列已由 _stringify_mixed 转为字符串）
+    :return: 缓存文件路径
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".tmp-")
+    os.close(fd)
+    try:
+        try:
+            df.to_parquet(tmp_path, index=False)
+            ext = '.parquet'
+        except (ImportError, ValueError, TypeError):
+            df.to_pickle(tmp_path)
+            ext = '.pkl'
+        path = os.path.join(cache_dir, key + ext)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    prefix = key.split('-')[0] + '-'
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and os.path.join(cache_dir, name) != path:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+    return path
+
+def _year_from_numbers(numbers):
+    """数值的整数部分恰好是 4 位数时就是年份（与转成字符串后取第一个 4 位数字结果相同）"""
+    years = np.floor(np.abs(numbers))
+    return years.where((years >= 1000) & (years <= 9999))
+
+def _year_from_strings(strings):
+    """字符串中第一个连续的 4 位数字；同样的字符串只解析一次"""
+    codes, uniques = pd.factorize(strings)
+    parsed = pd.to_numeric(pd.Series(uniques, dtype=object).str.extract(r'(\d{4})', expand=False),
+                           errors='coerce').to_numpy(dtype='float64')
+    return pd.Series(parsed[codes], index=strings.index)
+
+def parse_work_year(values):
+    """
+    从“开始从事工作年份”一类的混合列中解析年份，结果与
+    pd.to_numeric(values.astype(str).str.extract(r'(\d{4})')[0], errors='coerce') 完全相同
+    但不把每个单元格都转成字符串再跑正则：
+      日期单元格直接取 .year；数值单元格直接取整数部分；
+      只有真正的字符串（以及少数整数部分不是 4 位数的数值）才走正则
+    :param values: pandas Series（数值、日期、字符串混合均可）
+    :return: float64 的 Series，无法解析的为 NaN
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.year.astype('float64')
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        numbers = values.astype('float64')
+    else:
+        types = values.map(type)
+        is_string = types.isin([str, np.str_])
+        is_date = types.isin([datetime, pd.Timestamp, date])
+        # 字符串不能交给 to_numeric（"1e3" 会被当成 1000），留给正则处理
+        numbers = pd.to_numeric(values.where(~is_string & ~is_date), errors='coerce')
+        if is_date.any():
+            dates = values[is_date]
+            numbers[is_date] = np.fromiter((d.year for d in dates), dtype='float64', count=len(dates))
+
+    years = _year_from_numbers(numbers)
+    # 其余非空单元格：字符串，以及整数部分不是 4 位数的数值（如 12.3456、True）按原来的方式解析
+    fallback = years.isna() & values.notna()
+    if fallback.any():
+        years[fallback] = _year_from_strings(values[fallback].astype(str))
+    return years.astype('float64')
+
+def _read_source(file_path, usecols, dtype, engine):
+    """解析源文件（Excel 或 CSV），只读取需要的列"""
+    if file_path.lower().endswith(EXCEL_EXTENSIONS):
+        return pd.read_excel(file_path, usecols=usecols, dtype=dtype,
+                             engine=engine or choose_engine(file_path))
+    return pd.read_csv(file_path, usecols=usecols, dtype=dtype)
+
+def _default_dtype(usecols):
+    return {col: t for col, t in DATASET_DTYPES.items() if usecols is None or col in usecols}
+
+def _dataset_key(file_path, usecols, dtype, numeric_columns, parsers):
+    return cache_key(file_path, usecols=usecols, dtype=dtype, numeric=list(numeric_columns),
+                     parsers={col: func.__name__ for col, func in (parsers or {}).items()})
+
+def _convert(df, numeric_columns, parsers):
+    """读取后的类型转换：数值列转换为数值，再执行各列的解析函数"""
+    for col in numeric_columns:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col, func in (parsers or {}).items():
+        if col in df.columns:
+            df[col] = func(df[col])
+    return df
+
+def _stringify_mixed(df):
+    """
+    把混有多种类型的 object 列（如 Excel 中数字和文字混在一列）转为字符串，缺失值保持为缺失
+    转换后缓存总能写成 Parquet，之后可以分块读取；结果与 astype(str) 后的文本相同，
+    parse_work_year 等按字符串解析的函数得到的结果不变
+    """
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) not in PARQUET_OBJECT_TYPES:
+            df[col] = df[col].astype('string')
+    return df
+
+def read_dataset(file_path, usecols=None, dtype=None, numeric_columns=NUMERIC_COLUMNS,
+                 parsers=None, engine=None, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    读取数据集：只读需要的列、显式指定类型，并把结果转换为列式缓存
+    源文件（大小、修改时间）和读取参数都没变时，直接从缓存加载，不再解析 Excel
+    :param file_path: 数据文件（.xls / .xlsx / .csv）
+    :param usecols: 需要读取的列名列表，None 表示全部
+    :param dtype: 列类型，默认 DATASET_DTYPES（只取实际读取的列）
+    :param numeric_columns: 读取后转换为数值的列
+    :param parsers: {列名: 解析函数}，如 {'开始从事工作年份': parse_work_year}；
+                    解析后的列随缓存一起保存，之后的运行不再重复解析
+    混有多种类型、未经转换的 object 列以字符串返回（见 _stringify_mixed）
+    :param engine: read_excel 引擎，默认见 choose_engine
+    :param cache_dir: 缓存目录；为 None 时不使用缓存
+    :return: pandas DataFrame
+    """
+    if dtype is None:
+        dtype = _default_dtype(usecols)
+    key = None
+    if cache_dir is not None:
+        key = _dataset_key(file_path, usecols, dtype, numeric_columns, parsers)
+        df = _read_cache(cache_dir, key)
+        if df is not None:
+            return df
+
+    df = _stringify_mixed(_convert(_read_source(file_path, usecols, dtype, engine), numeric_columns, parsers))
+
+    if key is not None:
+        _write_cache(df, cache_dir, key)
+    return df
+
+def _iter_parquet(path, chunksize, columns=None):
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+        yield batch.to_pandas()
+
+def iter_dataset_chunks(file_path, chunksize=DEFAULT_CHUNK_ROWS, usecols=None, dtype=None,
+                        numeric_columns=NUMERIC_COLUMNS, parsers=None, engine=None,
+                        cache_dir=DEFAULT_CACHE_DIR):
+    """
+    按行分块读取数据集，每块是一个 DataFrame，内存占用只与块大小有关
+    CSV 直接分块解析，Parquet 按批读取（需要 pyarrow）；
+    Excel 无法增量解析，第一次会整体解析并写入列式缓存（同 read_dataset），之后分块读取缓存；
+    没有 pyarrow（缓存只能是 pickle）或不使用缓存时只能整体读入再切块，此时发出警告
+    参数含义同 read_dataset
+    """
+    if dtype is None:
+        dtype = _default_dtype(usecols)
+    lower = file_path.lower()
+    if lower.endswith('.parquet'):
+        for chunk in _iter_parquet(file_path, chunksize, usecols):
+            yield _convert(chunk, numeric_columns, parsers)
+        return
+    if not lower.endswith(EXCEL_EXTENSIONS):
+        for chunk in pd.read_csv(file_path, usecols=usecols, dtype=dtype, chunksize=chunksize):
+            yield _convert(chunk, numeric_columns, parsers)
+        return
+
+    options = dict(usecols=usecols, dtype=dtype, numeric_columns=numeric_columns, parsers=parsers,
+                   engine=engine, cache_dir=cache_dir)
+    if cache_dir is not None:
+        key = _dataset_key(file_path, usecols, dtype, numeric_columns, parsers)
+        if _find_cache(cache_dir, key) is None:
+            read_dataset(file_path, **options)
+        path = _find_cache(cache_dir, key)
+        if path is not None and path.endswith('.parquet'):
+            yield from _iter_parquet(path, chunksize)
+            return
+    # 没有缓存或缓存只能是 pickle：整体读入后按行切块
+    warnings.warn(f"{file_path} 无法分块读取（需要 pyarrow 和缓存目录），将整体读入内存")
+    df = read_dataset(file_path, **options)
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+def _write_chunks(chunks, output_path):
+    """把若干 DataFrame 块依次写入同一个 CSV 或 Parquet 文件，返回写入的行数"""
+    rows = 0
+    if output_path.lower().endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for chunk in chunks:
+                schema = writer.schema if writer is not None else None
+                table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table)
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    for chunk in chunks:
+        first = rows == 0
+        chunk.to_csv(output_path, mode='w' if first else 'a', header=first, index=False,
+                     encoding='utf-8-sig' if first else 'utf-8')
+        rows += len(chunk)
+    return rows
+
+def clean_dataset_streaming(file_path, output_path=None, id_column='身份证号',
+                            chunksize=DEFAULT_CHUNK_ROWS, **read_options):
+    """
+    分块清洗数据集：删除全为空的列，再删除身份证号为空的行；内存占用只与块大小有关
+    第一遍扫描同时得到清洗前、清洗后两份缺失值统计（清洗后的统计只计身份证号非空的行），
+    并由此确定全为空的列；第二遍删除这些列和行，把清洗后的块逐块写入 output_path
+    :param file_path: 数据文件，见 iter_dataset_chunks
+    :param output_path: 清洗结果（.csv 或 .parquet）；为 None 时只统计不写出
+    :param id_column: 身份证号列名
+    :param chunksize: 每块行数
+    :param read_options: 传给 iter_dataset_chunks 的其他参数
+    :return: 统计信息字典（行数、删除的列、前 5 行、各列类型、清洗前/后的缺失值统计）
+    """
+    rows = kept_rows = 0
+    nulls_before = nulls_after = None
+    head = dtypes = None
+    for chunk in iter_dataset_chunks(file_path, chunksize, **read_options):
+        if head is None:
+            head, dtypes = chunk.head(), chunk.dtypes
+        has_id = chunk[id_column].notna()
+        before = chunk.isnull().sum()
+        after = chunk[has_id].isnull().sum()
+        nulls_before = before if nulls_before is None else nulls_before.add(before, fill_value=0)
+        nulls_after = after if nulls_after is None else nulls_after.add(after, fill_value=0)
+        rows += len(chunk)
+        kept_rows += int(has_id.sum())
+
+    if nulls_before is None:
+        raise ValueError(f"数据集为空: {file_path}")
+    empty_columns = [col for col, count in nulls_before.items() if count == rows]
+    stats = {
+        "rows": rows,
+        "kept_rows": kept_rows,
+        "empty_columns": empty_columns,
+        "head": head,
+        "dtypes": dtypes,
+        "nulls_before": nulls_before.astype('int64'),
+        "nulls_after": nulls_after.drop(empty_columns).astype('int64'),
+    }
+
+    if output_path is not None:
+        cleaned = (chunk.drop(columns=empty_columns)[chunk[id_column].notna()]
+                   for chunk in iter_dataset_chunks(file_path, chunksize, **read_options))
+        _write_chunks(cleaned, output_path)
+    return stats
@@ -1,6 +1,8 @@
+import os
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from dataset_io import clean_dataset_streaming
 
 # 测试 NumPy
 data1 = [1, 3, 5, 7]
@@ -31,28 +33,30 @@ plt.show()
 
 
 file_path = r'E:\林zr\dataset.xls'
+# 清洗后的数据写到源文件旁边
+cleaned_path = os.path.splitext(file_path)[0] + '_cleaned.csv'
 
-# 读取 Excel 文件
-df = pd.read_excel(file_path)
+# 分块读取并清洗（身份证号按字符串、性别按 category 读取；第二次运行直接读取列式缓存）：
+#   第一遍扫描同时得到清洗前、清洗后的缺失值统计，第二遍删除全为空的列和身份证号为空的行并逐块写出，
+#   内存占用只与块大小有关，不随数据量增长
+# 这里要统计原始缺失值，所以不做数值转换（转换会把脏数据也变成缺失值）
+report = clean_dataset_streaming(file_path, cleaned_path, id_column='身份证号', numeric_columns=())
 
 # 显示前 5 行数据
 print("\n数据集前 5 行预览：")
-print(df.head())
+print(report['head'])
 
 # 3-1 查看数据类型及缺失值统计
 print("\n各字段数据类型：")
-print(df.dtypes)
+print(report['dtypes'])
 
 print("\n各字段缺失值统计：")
-print(df.isnull().sum())
+print(report['nulls_before'])
 
-# 3-2 删除全为空的列
-df.dropna(axis=1, how='all', inplace=True)
-
-# 3-3 删除“身份证号”为空的数据
-df.dropna(subset=['身份证号'], inplace=True)
+# 3-2 删除全为空的列、3-3 删除“身份证号”为空的数据（已在分块清洗中完成）
+print(f"\n删除全为空的列: {report['empty_columns']}")
+print(f"保留 {report['kept_rows']}/{report['rows']} 行，清洗后的数据已保存到: {cleaned_path}")
 
 # 再次查看缺失值统计结果
 print("\n删除缺失值后的统计结果：")
-print(df.isnull().sum())
-
+print(report['nulls_after'])
@@ -3,6 +3,8 @@
 # ==============================
 import pandas as pd
 import matplotlib.pyplot as plt
+from dataset_io import read_dataset, parse_work_year
+from aggregation import aggregate, select_metric
 
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
@@ -11,8 +13,11 @@ plt.rcParams['axes.unicode_minus'] = False
 # 2. 读取数据（你指定的路径）
 # ==============================
 file_path = r"E:\林zr\dataset.xls"
+# 只读取用到的列；体检年份、白细胞计数在读取时就已转换为数值，性别为 category
+usecols = ['性别', '体检年份', '开始从事工作年份', '白细胞计数']
 
-data = pd.read_excel(file_path)
+# “开始从事工作年份”在读取时就解析为年份数值，并随列式缓存一起保存
+data = read_dataset(file_path, usecols=usecols, parsers={'开始从事工作年份': parse_work_year})
 print("✅ 数据读取成功")
 print("原始列名：", data.columns.tolist())
 
@@ -21,12 +26,11 @@ print("原始列名：", data.columns.tolist())
 # ==============================
 
 # 3-1 处理“开始从事工作年份” → “参加工作时间”
-data['参加工作时间'] = data['开始从事工作年份'].astype(str).str.extract(r'(\d{4})')
-data['参加工作时间'] = pd.to_numeric(data['参加工作时间'], errors='coerce')
+# 数值、日期单元格直接取年份，只有字符串才用正则提取 4 位数字（见 dataset_io.parse_work_year）
+data['参加工作时间'] = data['开始从事工作年份']
 data.drop(columns=['开始从事工作年份'], inplace=True)
 
-# 3-2 强制把“体检年份”转成数值（⭐关键修复）
-data['体检年份'] = pd.to_numeric(data['体检年份'], errors='coerce')
+# 3-2 “体检年份”已在读取时转成数值（⭐关键修复，见 dataset_io.NUMERIC_COLUMNS）
 
 # 3-3 删除缺失值
 data.dropna(subset=['体检年份', '参加工作时间'], inplace=True)
@@ -36,10 +40,22 @@ data['工龄'] = data['体检年份'] - data['参加工作时间']
 print("\n已成功计算工龄")
 print(data[['性别', '体检年份', '参加工作时间', '工龄']].head())
 
+# 3-5 工龄段（替代年龄段）
+bins = [0, 5, 10, 15, float('inf')]
+labels = ['≤5年', '6~10年', '11~15年', '>15年']
+data['工龄段'] = pd.cut(data['工龄'], bins=bins, labels=labels)
+
+# 3-6 一次分组统计所有报表要用的指标（按性别、工龄段分组），
+#     新增报表只需从 wbc_stats 中取，不用再扫描数据
+wbc_stats = aggregate(data, keys=['性别', '工龄段'], values=['白细胞计数'],
+                      metrics=('count', 'mean', 'std'), quantiles=(0.25, 0.5, 0.75))
+print("\n--- 白细胞计数分组统计 ---")
+print(wbc_stats)
+
 # ==============================
 # 4. 不同性别白细胞计数均值
 # ==============================
-gender_wbc_mean = data.groupby('性别')['白细胞计数'].mean()
+gender_wbc_mean = select_metric(wbc_stats, '性别', '白细胞计数', 'mean')
 print("\n--- 不同性别白细胞均值 ---")
 print(gender_wbc_mean)
 
@@ -55,11 +71,7 @@ plt.show()
 # ==============================
 # 5. 工龄段分析（替代年龄段）
 # ==============================
-bins = [0, 5, 10, 15, float('inf')]
-labels = ['≤5年', '6~10年', '11~15年', '>15年']
-
-data['工龄段'] = pd.cut(data['工龄'], bins=bins, labels=labels)
-workyear_wbc_mean = data.groupby('工龄段')['白细胞计数'].mean()
+workyear_wbc_mean = select_metric(wbc_stats, '工龄段', '白细胞计数', 'mean')
 
 print("\n--- 不同工龄段白细胞均值 ---")
 print(workyear_wbc_mean)
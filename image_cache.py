@@ -0,0 +1,157 @@
+import os
+import json
+import hashlib
+import tempfile
+from io import BytesIO
+from PIL import Image
+
+# 默认缓存目录，可通过环境变量 PNG_TOOLS_CACHE_DIR 修改
+DEFAULT_CACHE_DIR = os.environ.get(
+    "PNG_TOOLS_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "png_tools"),
+)
+# 默认缓存容量上限（字节），超出后按最近最少使用（LRU）淘汰
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def hash_bytes(data):
+    """计算字节串的 SHA-256 摘要（十六进制）"""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path):
+    """分块计算文件内容的 SHA-256 摘要，不把整个文件读入内存"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ImageCache:
+    """
+    基于内容寻址的磁盘缓存
+    键由输入内容的摘要和操作参数（方法、尺寸、重采样方式等）共同决定，
+    输入不变时重复运行只需要一次哈希计算。写入是原子的（临时文件 + os.replace），
+    读取命中时刷新文件修改时间，超出容量时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._total_bytes = None  # 首次写入时再统计，避免启动时扫描目录
+
+    @staticmethod
+    def make_key(source_digest, **params):
+        """
+        生成缓存键
+        :param source_digest: 输入内容的摘要（见 hash_bytes / hash_file）
+        :param params: 操作参数，如 op="luminance", method="weighted"
+        :return: 缓存键（十六进制字符串）
+        """
+        payload = json.dumps({"source": source_digest, "params": params},
+                             sort_keys=True, default=str)
+        return hash_bytes(payload.encode('utf-8'))
+
+    def _path(self, key):
+        # 按前两位分子目录，避免单个目录下文件过多
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get_path(self, key):
+        """命中时返回缓存文件路径并刷新其使用时间，未命中返回 None"""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def get_bytes(self, key):
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put_bytes(self, key, data):
+        """原子地写入缓存条目，返回缓存文件路径"""
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if self._total_bytes is None:
+            self._total_bytes = self._scan_size()
+        else:
+            self._total_bytes += len(data) - old_size
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+        return path
+
+    def get_image(self, key):
+        """命中时返回已加载的 PIL Image对象，未命中返回 None"""
+        data = self.get_bytes(key)
+        if data is None:
+            return None
+        try:
+            img = Image.open(BytesIO(data))
+            img.load()
+            return img
+        except Exception:
+            return None
+
+    def put_image(self, key, image, format='PNG'):
+        """把 PIL 图像编码后写入缓存"""
+        buffer = BytesIO()
+        image.save(buffer, format)
+        return self.put_bytes(key, buffer.getvalue())
+
+    def _entries(self):
+        """列出所有缓存条目 (修改时间, 大小, 路径)"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.is_file() and not entry.name.startswith(".tmp-"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """按最近最少使用顺序删除条目，直到总大小不超过上限"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+
+    def clear(self):
+        """清空缓存"""
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._total_bytes = 0
@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import tracemalloc
+import contextlib
+
+# 设置环境变量 PNG_TOOLS_PROFILE 即可开启分阶段统计：
+#   PNG_TOOLS_PROFILE=1            退出时打印各阶段汇总
+#   PNG_TOOLS_PROFILE=stages.jsonl 同时把每条记录以 JSON Lines 追加到该文件
+# 批量模式的工作进程各自记录且退出时不打印汇总，需要完整统计时请使用 .jsonl 文件，
+# 再用 python instrumentation.py stages.jsonl 汇总
+PROFILE_ENV_VAR = "PNG_TOOLS_PROFILE"
+# 流水线中的标准阶段名
+STAGES = ("decode", "convert", "luminance", "resize", "encode", "stats", "plot")
+
+def image_nbytes(image):
+    """PIL 图像像素数据的字节数（用于统计各阶段处理的数据量）"""
+    if image.mode in ("I;16", "I;16B", "I;16L"):
+        band_bytes = 2
+    elif image.mode in ("I", "F"):
+        band_bytes = 4
+    else:
+        band_bytes = 1
+    return image.width * image.height * len(image.getbands()) * band_bytes
+
+def load_image(image):
+    """
+    在 decode 阶段内完成 PIL 的惰性解码，返回图像本身
+    Image.open 只读取文件头，真正的解码发生在第一次访问像素时；已解码的图像不会产生记录
+    """
+    if getattr(image, "tile", None):
+        with stage("decode") as record:
+            image.load()
+            record["bytes"] = image_nbytes(image)
+    return image
+
+class StageRecorder:
+    """
+    记录每个阶段的耗时、处理的字节数和内存分配峰值（tracemalloc）
+    阶段可以嵌套：外层阶段的峰值包含内层。多个线程同时记录时，内存峰值只是近似值。
+    tracemalloc 只能看到 Python/NumPy 的分配，Pillow 内部的像素缓冲区不计入峰值。
+    """
+
+    def __init__(self, trace_memory=True, jsonl_path=None):
+        self.trace_memory = trace_memory
+        self.jsonl_path = jsonl_path
+        self.records = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _open_stages(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _collect_peak(self, stack):
+        """把到目前为止的分配峰值记到所有未结束的阶段上，然后重置峰值"""
+        current, peak = tracemalloc.get_traced_memory()
+        for entry in stack:
+            entry["peak"] = max(entry["peak"], peak)
+        tracemalloc.reset_peak()
+        return current
+
+    @contextlib.contextmanager
+    def stage(self, name, nbytes=0, **info):
+        """
+        记录一个阶段；yield 的字典可以在阶段内补充 bytes 等信息
+        :param name: 阶段名，见 STAGES
+        :param nbytes: 处理的字节数（事先不知道时可在阶段内设置 record["bytes"]）
+        """
+        record = {"stage": name, "bytes": nbytes, **info}
+        stack = self._open_stages()
+        entry = {"peak": 0, "start_mem": 0}
+        if self.trace_memory:
+            entry["start_mem"] = self._collect_peak(stack)
+        stack.append(entry)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = time.perf_counter() - start
+            if self.trace_memory:
+                self._collect_peak(stack)
+                record["peak_alloc_bytes"] = max(0, entry["peak"] - entry["start_mem"])
+            stack.pop()
+            record["thread"] = threading.current_thread().name
+            self._add(record)
+
+    def _add(self, record):
+        with self._lock:
+            self.records.append(record)
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def summary(self):
+        """按阶段汇总：次数、总耗时、平均耗时、字节数、吞吐量、最大分配峰值"""
+        rows = {}
+        for record in self.records:
+            row = rows.setdefault(record["stage"], {"stage": record["stage"], "count": 0, "wall_s": 0.0,
+                                                    "bytes": 0, "peak_alloc_bytes": 0})
+            row["count"] += 1
+            row["wall_s"] += record["wall_s"]
+            row["bytes"] += record.get("bytes") or 0
+            row["peak_alloc_bytes"] = max(row["peak_alloc_bytes"], record.get("peak_alloc_bytes", 0))
+        for row in rows.values():
+            row["mean_ms"] = row["wall_s"] / row["count"] * 1000
+            row["mb_per_s"] = row["bytes"] / 1e6 / row["wall_s"] if row["wall_s"] > 0 else 0.0
+        order = {name: i for i, name in enumerate(STAGES)}
+        return sorted(rows.values(), key=lambda row: order.get(row["stage"], len(order)))
+
+    def print_report(self, file=None):
+        """打印各阶段汇总表"""
+        file = file or sys.stderr
+        rows = self.summary()
+        if not rows:
+            return
+        total = sum(row["wall_s"] for row in rows) or 1.0
+        print(f"\n{'阶段':<10} {'次数':>6} {'总耗时(s)':>10} {'占比':>6} {'平均(ms)':>10} "
+              f"{'数据(MB)':>9} {'MB/s':>8} {'分配峰值(MB)':>12}", file=file)
+        for row in rows:
+            print(f"{row['stage']:<10} {row['count']:>6} {row['wall_s']:>10.3f} {row['wall_s'] / total:>6.1%} "
+                  f"{row['mean_ms']:>10.2f} {row['bytes'] / 1e6:>9.1f} {row['mb_per_s']:>8.1f} "
+                  f"{row['peak_alloc_bytes'] / 1e6:>12.1f}", file=file)
+
+_recorder = None  # 全局记录器；为 None 时 stage() 不做任何记录
+
+def enable(trace_memory=True, jsonl_path=None, report_at_exit=True):
+    """开启分阶段统计，返回 StageRecorder"""
+    global _recorder
+    _recorder = StageRecorder(trace_memory=trace_memory, jsonl_path=jsonl_path)
+    if report_at_exit:
+        atexit.register(_recorder.print_report)
+    return _recorder
+
+def disable():
+    """关闭统计，返回之前的记录器（可继续读取其中的记录）"""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return recorder
+
+def get_recorder():
+    return _recorder
+
+@contextlib.contextmanager
+def stage(name, nbytes=0, **info):
+    """
+    标记流水线中的一个阶段；未开启统计时几乎没有开销
+    用法：with stage("decode") as rec: ...; rec["bytes"] = image_nbytes(img)
+    """
+    if _recorder is None:
+        yield {}
+        return
+    with _recorder.stage(name, nbytes, **info) as record:
+        yield record
+
+def _enable_from_env():
+    value = os.environ.get(PROFILE_ENV_VAR, "")
+    if value and value != "0":
+        enable(jsonl_path=value if value.endswith((".jsonl", ".json")) else None)
+
+_enable_from_env()
+
+if __name__ == "__main__":
+    # 汇总 JSON Lines 记录文件（可包含多个进程写入的记录）
+    recorder = StageRecorder(trace_memory=False)
+    for path in sys.argv[1:]:
+        with open(path, encoding="utf-8") as f:
+            recorder.records.extend(json.loads(line) for line in f if line.strip())
+    recorder.print_report(sys.stdout)
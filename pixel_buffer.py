@@ -0,0 +1,80 @@
+import contextlib
+import numpy as np
+from PIL import Image
+from instrumentation import stage, image_nbytes
+
+# PIL 与 NumPy 之间的像素交接统一经过这里，复制只发生在标注为“复制边界”的函数中：
+#   as_array    PIL -> numpy：Pillow 只能通过 tobytes() 导出像素，固定复制一次；返回只读视图，不再复制第二次
+#   iter_bands  PIL -> numpy：按行带导出，tobytes() 拼接时的两倍峰值只占一个行带
+#   read_into   PIL -> numpy：按行带写入预分配的数组，整幅只占一份内存
+#   as_image    numpy -> PIL：L / RGBA / I;16 等模式且内存连续时直接引用数组内存，不复制
+# 其余代码只在数组视图上计算，输出写入调用方提供的缓冲区（见 BufferPool）。
+
+# 行带导出时每个行带的行数
+BAND_ROWS = 256
+
+def as_array(image):
+    """
+    PIL 图像 -> numpy 数组（复制边界：复制一次）
+    返回的数组只读；确实需要修改时由调用方显式 .copy()
+    """
+    return np.asarray(image)
+
+def iter_bands(image, band_rows=BAND_ROWS, mode=None):
+    """
+    按行带产生 (起始行, 只读数组)（复制边界：每个行带复制一次）
+    :param mode: 需要的 PIL 模式，与图像不同时逐个行带转换，不生成整幅的转换结果
+    行带转换不单独记录阶段，由调用方在整个循环外记录一次（见 read_into）
+    """
+    for start in range(0, image.height, band_rows):
+        box = (0, start, image.width, min(start + band_rows, image.height))
+        band = image.crop(box)
+        if mode is not None and band.mode != mode:
+            band = band.convert(mode)
+        yield start, as_array(band)
+
+def read_into(image, out=None, mode=None):
+    """
+    PIL 图像 -> numpy 数组，按行带写入 out（复制边界：整幅只占 out 一份内存）
+    :param out: 预分配的数组，形状与 dtype 须与 as_array 的结果一致；为 None 时新建
+    :param mode: 需要的 PIL 模式，见 iter_bands
+    :return: out
+    """
+    # 需要转换模式时整幅记为一条 convert 记录
+    converting = mode is not None and image.mode != mode
+    with stage("convert", image_nbytes(image)) if converting else contextlib.nullcontext():
+        for start, band in iter_bands(image, mode=mode):
+            if out is None:
+                out = np.empty((image.height,) + band.shape[1:], dtype=band.dtype)
+            out[start:start + band.shape[0]] = band
+    return out
+
+def as_image(array):
+    """
+    numpy 数组 -> PIL 图像
+    L / P / RGBA / RGBX / CMYK / I;16 模式且内存连续时与数组共享内存（零复制，图像只读，
+    数组之后的修改会反映到图像上）；RGB 在 Pillow 内部每像素占 4 字节，或数组不连续时复制一次（复制边界）
+    """
+    return Image.fromarray(array)
+
+class BufferPool:
+    """
+    按 (形状, dtype) 复用的预分配输出缓冲区
+    批量处理同尺寸的图片时，结果直接写入同一块内存，不必每张图片重新分配。
+    同一形状的缓冲区在下一次 get 时会被覆盖，调用方需在此之前用完（如已编码保存）。
+    """
+
+    def __init__(self, max_buffers=4):
+        self.max_buffers = max_buffers
+        self._buffers = {}
+
+    def get(self, shape, dtype=np.uint8):
+        """返回形状为 shape 的未初始化缓冲区；超出 max_buffers 个时淘汰最久未用的"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        buffer = self._buffers.pop(key, None)
+        if buffer is None:
+            buffer = np.empty(shape, dtype=dtype)
+        self._buffers[key] = buffer
+        while len(self._buffers) > self.max_buffers:
+            self._buffers.pop(next(iter(self._buffers)))
+        return buffer
@@ -0,0 +1,169 @@
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+from PIL import Image
+from image_cache import hash_file
+from instrumentation import stage, load_image
+from pixel_buffer import as_image, read_into
+
+# 设置环境变量 PNG_TOOLS_PIXEL_STORE 即可开启像素存储（命令行中的 --pixel-store 优先）：
+#   PNG_TOOLS_PIXEL_STORE=sidecar  解码结果保存在源文件旁边，如 photo.png.RGB.npy + photo.png.RGB.json
+#   PNG_TOOLS_PIXEL_STORE=目录      统一保存到该目录下
+PIXEL_STORE_ENV_VAR = "PNG_TOOLS_PIXEL_STORE"
+SIDECAR = "sidecar"
+
+def _decode(image, mode):
+    """解码 PIL 图像并按行带转换为指定模式，返回 numpy 数组"""
+    return read_into(load_image(image), mode=mode)
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class PixelStore:
+    """
+    解码后像素的磁盘存储：每个 (源文件, 模式) 对应一个 .npy 数组文件和一个 .json 元数据文件
+    之后的运行用 np.load(mmap_mode='r') 内存映射打开，跳过 PNG 的 zlib 解压和滤波还原，
+    只有真正访问到的页才会从磁盘读入，多个进程打开同一文件时共享页缓存。
+    有效性检查：源文件大小和修改时间 (mtime_ns) 与记录一致时直接使用；大小相同但修改时间变了，
+    再比较内容的 SHA-256，一致则更新记录继续使用（如复制或 touch 过的文件），否则重新解码覆盖。
+    """
+
+    def __init__(self, store_dir=None):
+        """:param store_dir: 存储目录；None 表示保存在源文件旁边（sidecar）"""
+        self.store_dir = store_dir
+
+    def paths(self, source_path, mode):
+        """返回 (数组文件路径, 元数据文件路径)"""
+        if self.store_dir is None:
+            base = f"{source_path}.{mode}"
+        else:
+            name = hashlib.sha256(os.path.abspath(source_path).encode('utf-8')).hexdigest()[:32]
+            base = os.path.join(self.store_dir, name[:2], f"{name}.{mode}")
+        return base + ".npy", base + ".json"
+
+    def load(self, source_path, mode):
+        """
+        存储有效时返回只读的内存映射数组 (np.memmap)，否则返回 None
+        :param source_path: 源图像文件路径
+        :param mode: PIL 模式，如 "RGB"、"L"
+        """
+        array_path, meta_path = self.paths(source_path, mode)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            stat = os.stat(source_path)
+        except (OSError, ValueError):
+            return None
+        if meta.get("size") != stat.st_size:
+            return None
+        if meta.get("mtime_ns") != stat.st_mtime_ns:
+            if hash_file(source_path) != meta.get("sha256"):
+                return None
+            meta["mtime_ns"] = stat.st_mtime_ns
+            try:
+                self._write_meta(meta_path, meta)
+            except OSError:
+                pass
+        try:
+            with stage("decode", source="pixel_store") as record:
+                array = np.load(array_path, mmap_mode='r', allow_pickle=False)
+                record["bytes"] = array.nbytes
+        except (OSError, ValueError):
+            return None
+        if list(array.shape) != meta.get("shape") or str(array.dtype) != meta.get("dtype"):
+            return None
+        return array
+
+    def save(self, source_path, mode, array, stat=None):
+        """
+        原子地写入像素数组及元数据
+        :param stat: 解码前取得的源文件 os.stat 结果（避免记录解码期间被修改的文件）
+        :return: 数组文件路径；无法写入（如目录只读）时返回 None
+        """
+        array_path, meta_path = self.paths(source_path, mode)
+        stat = stat or os.stat(source_path)
+        meta = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": hash_file(source_path),
+                "mode": mode, "shape": list(array.shape), "dtype": str(array.dtype)}
+        directory = os.path.dirname(array_path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # 先删除旧的元数据，数组写完之前记录一律无效
+            _remove(meta_path)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".npy")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.lib.format.write_array(f, np.ascontiguousarray(array), allow_pickle=False)
+                os.replace(tmp_path, array_path)
+            except BaseException:
+                _remove(tmp_path)
+                raise
+            self._write_meta(meta_path, meta)
+        except OSError:
+            return None
+        return array_path
+
+    def _write_meta(self, meta_path, meta):
+        directory = os.path.dirname(meta_path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, meta_path)
+        except BaseException:
+            _remove(tmp_path)
+            raise
+
+    def open_array(self, source_path, mode, image=None):
+        """
+        获取源图像在指定模式下的像素数组
+        存储有效时内存映射打开（不解码、不复制）；否则解码、转换并写入存储，本次直接返回解码结果
+        :param image: 已打开的源图像（可选，省去再次打开文件）
+        :return: 形状为 (高, 宽) 或 (高, 宽, 通道数) 的数组
+        """
+        array = self.load(source_path, mode)
+        if array is not None:
+            return array
+        stat = os.stat(source_path)
+        if image is None:
+            with Image.open(source_path) as img:
+                array = _decode(img, mode)
+        else:
+            array = _decode(image, mode)
+        self.save(source_path, mode, array, stat)
+        return array
+
+    def open_image(self, source_path, mode, image=None):
+        """
+        同 open_array，但返回 PIL 图像
+        L、RGBA 等模式直接引用内存映射（只读）；RGB 在 Pillow 内部按 4 字节存储，会复制一次
+        """
+        return as_image(self.open_array(source_path, mode, image=image))
+
+    def discard(self, source_path, mode):
+        """删除某个源文件在指定模式下的存储"""
+        for path in self.paths(source_path, mode):
+            _remove(path)
+
+def get_store(location=None):
+    """
+    按位置创建 PixelStore
+    :param location: None 表示读取环境变量 PNG_TOOLS_PIXEL_STORE；"sidecar" 或 "1" 表示保存在源文件旁边；
+                     其他值为存储目录；空字符串或 "0" 表示不使用
+    :return: PixelStore，未开启时返回 None
+    """
+    if location is None:
+        location = os.environ.get(PIXEL_STORE_ENV_VAR, "")
+    if not location or location == "0":
+        return None
+    return PixelStore(None if location in (SIDECAR, "1") else location)
+
+def add_store_argument(parser):
+    """给命令行解析器添加 --pixel-store 选项（不带目录时保存在源文件旁边）"""
+    parser.add_argument("--pixel-store", nargs="?", const=SIDECAR, default=None, metavar="DIR",
+                        help="把解码后的像素保存为 .npy，之后的运行内存映射读取、跳过解码"
+                             f"（不带目录时保存在源文件旁边；默认读取环境变量 {PIXEL_STORE_ENV_VAR}）")
@@ -2,6 +2,14 @@ from PIL import Image, ImageDraw
 import os
 import sys
 
+# 与仓库根目录的脚本共用 PNG 编码配置（png_encoding.PNG_PROFILES：fast 最快 / balanced 平衡 /
+# smallest 文件最小）以及缩放的快速路径参数和模式选择（PNG_scale.REDUCING_GAP、_prepare_for_resize）
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+from png_encoding import png_save_options
+from PNG_scale import REDUCING_GAP, _prepare_for_resize
+
 def get_script_dir():
     """获取脚本所在目录的绝对路径"""
     return os.path.dirname(os.path.abspath(sys.argv[0]))
@@ -41,7 +49,8 @@ def create_test_image(output_name="test.png", width=640, height=480):
         return None
 
 def resize_image(input_path, output_path=None, width=None, height=None, 
-                scale=None, keep_aspect=True, method=Image.Resampling.LANCZOS):
+                scale=None, keep_aspect=True, method=Image.Resampling.LANCZOS,
+                reducing_gap=REDUCING_GAP, profile="balanced"):
     """
     PNG图片缩放工具
     
@@ -53,17 +62,18 @@ def resize_image(input_path, output_path=None, width=None, height=None,
         scale: 缩放比例
         keep_aspect: 是否保持宽高比
         method: 重采样方法
+        reducing_gap: 大幅缩小时的快速路径参数(取舍见 PNG_scale.REDUCING_GAP)，None 表示全分辨率重采样
+        profile: PNG 编码配置(见 png_encoding.PNG_PROFILES)
     """
     try:
+        # 先检查编码配置，无效时不必读取图片
+        save_options = png_save_options(profile)
+        
         # 处理输入路径
         if not os.path.isabs(input_path):
             input_path = os.path.join(get_script_dir(), input_path)
             
         with Image.open(input_path) as img:
-            # 确保处理RGBA模式以保留透明度
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
             original_width, original_height = img.size
             
             # 处理输出路径
@@ -104,14 +114,18 @@ def resize_image(input_path, output_path=None, width=None, height=None,
             print(f"原始尺寸: {original_width}x{original_height}")
             print(f"新尺寸: {new_width}x{new_height}")
             
+            # 解码时缩小，且只在有透明度时转为RGBA
+            img = _prepare_for_resize(img, (new_width, new_height))
+            
             # 执行缩放
-            resized_img = img.resize((new_width, new_height), resample=method)
+            resized_img = img.resize((new_width, new_height), resample=method,
+                                     reducing_gap=reducing_gap)
             
             # 确保输出目录存在
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
             # 保存图片
-            resized_img.save(output_path, 'PNG', optimize=True)
+            resized_img.save(output_path, 'PNG', **save_options)
             print(f"图片已保存至: {output_path}")
             return output_path
             
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from PIL import Image
+
+import image_cache
+from image_cache import ImageCache
+from PNG_extracted import download_sample_image, _download_key
+
+def _png_bytes(color):
+    buffer = BytesIO()
+    Image.new("RGB", (8, 6), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+class _SampleHandler(BaseHTTPRequestHandler):
+    """本地替身服务器：/red.png 和 /blue.png 返回图片，其余路径返回 404"""
+    images = {"/red.png": _png_bytes("red"), "/blue.png": _png_bytes("blue")}
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append(self.path)
+        data = self.images.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class DownloadCacheTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _SampleHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, True)
+        self.cache = ImageCache(self.cache_dir)
+        _SampleHandler.requests = []
+
+    def test_miss_downloads_and_stores(self):
+        url = self.base_url + "/red.png"
+        img = download_sample_image(cache=self.cache, sample_urls=[url])
+        self.assertEqual(img.getpixel((0, 0)), (255, 0, 0))
+        self.assertEqual(_SampleHandler.requests, ["/red.png"])
+        self.assertEqual(self.cache.get_bytes(_download_key(url)), _SampleHandler.images["/red.png"])
+
+    def test_second_run_makes_no_request(self):
+        url = self.base_url + "/red.png"
+        download_sample_image(cache=self.cache, sample_urls=[url])
+        _SampleHandler.requests = []
+        img = download_sample_image(cache=self.cache, sample_urls=[url])
+        self.assertEqual(img.getpixel((0, 0)), (255, 0, 0))
+        self.assertEqual(_SampleHandler.requests, [])
+
+    def test_key_follows_successful_url(self):
+        missing, blue = self.base_url + "/missing.png", self.base_url + "/blue.png"
+        img = download_sample_image(cache=self.cache, sample_urls=[blue, missing])
+        self.assertEqual(img.getpixel((0, 0)), (0, 0, 255))
+        self.assertIsNotNone(self.cache.get_path(_download_key(blue)))
+        self.assertIsNone(self.cache.get_path(_download_key(missing)))
+
+        img = download_sample_image(cache=self.cache, sample_urls=[missing, blue])
+        self.assertEqual(img.getpixel((0, 0)), (0, 0, 255))
+        self.assertEqual(_SampleHandler.requests, ["/blue.png"])
+
+class ImageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, True)
+
+    def _files(self):
+        return sorted(name for _, _, names in os.walk(self.cache_dir) for name in names)
+
+    def test_evict_removes_least_recently_used(self):
+        cache = ImageCache(self.cache_dir, max_bytes=10 ** 6)
+        for i, key in enumerate(("aa1", "bb2", "cc3")):
+            os.utime(cache.put_bytes(key, b"x" * 100), (1000 + i, 1000 + i))
+        # 读取最旧的条目后它变为最近使用
+        self.assertEqual(cache.get_bytes("aa1"), b"x" * 100)
+
+        cache.max_bytes = 200
+        cache.evict()
+        self.assertIsNone(cache.get_path("bb2"))
+        self.assertIsNotNone(cache.get_path("aa1"))
+        self.assertIsNotNone(cache.get_path("cc3"))
+
+        cache.max_bytes = 100
+        cache.evict()
+        self.assertEqual(self._files(), ["cc3"])
+
+    def test_interrupted_put_leaves_no_partial_file(self):
+        cache = ImageCache(self.cache_dir)
+        cache.put_bytes("aa1", b"old")
+        with mock.patch.object(image_cache.os, "replace", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                cache.put_bytes("aa1", b"new" * 1000)
+        self.assertEqual(self._files(), ["aa1"])
+        self.assertEqual(cache.get_bytes("aa1"), b"old")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import struct
+import tempfile
+import tracemalloc
+import unittest
+import zlib
+
+import numpy as np
+
+from PNG_extracted import PNG_SIGNATURE, _png_chunk, iter_png_bands
+
+def _write_single_idat_png(path, rgb_array):
+    """把 RGB 数组写成只有一个 IDAT 数据块的 PNG（每行滤波类型 0）"""
+    height, width = rgb_array.shape[:2]
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = rgb_array.reshape(height, width * 3)
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    with open(path, 'wb') as f:
+        f.write(PNG_SIGNATURE + _png_chunk(b'IHDR', ihdr)
+                + _png_chunk(b'IDAT', zlib.compress(rows.tobytes(), 1)) + _png_chunk(b'IEND', b''))
+
+class StreamingDecodeTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir, True)
+        # 随机噪声几乎不可压缩，压缩数据约与像素数据一样大（约 4.5 MB）
+        rng = np.random.default_rng(0)
+        self.pixels = rng.integers(0, 256, (1500, 1000, 3), dtype=np.uint8)
+        self.path = os.path.join(self.work_dir, "single_idat.png")
+        _write_single_idat_png(self.path, self.pixels)
+
+    def test_single_large_idat_memory_follows_band_size(self):
+        tracemalloc.start()
+        try:
+            rows = 0
+            for start, band in iter_png_bands(self.path, band_rows=16):
+                self.assertTrue(np.array_equal(np.asarray(band), self.pixels[start:start + band.height]))
+                rows += band.height
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(rows, self.pixels.shape[0])
+        # 整个 IDAT 一次读入时峰值在 9 MB 以上；分段读取后只与行带和分段大小有关
+        self.assertLess(peak, 2 * 1024 * 1024)
+
+    def test_corrupted_chunk_fails_crc_check(self):
+        # 改写 IDAT 的 CRC（文件末尾是 12 字节的 IEND，之前 4 字节即 IDAT 的 CRC）
+        with open(self.path, 'r+b') as f:
+            f.seek(-16, os.SEEK_END)
+            crc = f.read(4)
+            f.seek(-4, os.SEEK_CUR)
+            f.write(bytes(b ^ 0xff for b in crc))
+        with self.assertRaisesRegex(ValueError, "CRC"):
+            for _ in iter_png_bands(self.path, band_rows=256):
+                pass
+
+if __name__ == "__main__":
+    unittest.main()